@@ -3,8 +3,10 @@ import time
 from multiprocessing import Pool, cpu_count
 from copy import deepcopy
 
-from heuristics.construction.random import generate_random_solution
-from utils.utils import compute_total_cost, get_bks, convert_ndarrays
+from heuristics.construction.random import random_solution
+from utils.utils import compute_total_cost, get_bks, convert_ndarrays, load_instance
+from utils.parallel import SharedInstance, init_worker, worker_instance
+from utils.checkpoint import Checkpoint
 from heuristics.improvement.ls import hybrid_ls
 from heuristics.metaheuristics.instensifying_components.ils import iterated_local_search
 from heuristics.metaheuristics.diversifying_components.simulated_annealing import simulated_annealing
@@ -12,8 +14,8 @@ from heuristics.metaheuristics.instensifying_components.tabu import tabu_search
 from heuristics.metaheuristics.diversifying_components.genetic_algorithm import genetic_algorithm
 from heuristics.metaheuristics.diversifying_components.lns import fast_lns, smart_lns
 import json
+import shutil
 import numpy as np
-import vrplib
 import os
 
 
@@ -29,13 +31,21 @@ benchmark_instances = ["X-n502-k39.vrp",
                        "X-n856-k95.vrp",
                        "X-n916-k207.vrp"]
 
+# Rounded (CVRPLIB) distances, so the costs and gaps are directly comparable to the BKS
+DISTANCES = "rounded"
+
+# Every solver run saves its state here every CHECKPOINT_INTERVAL seconds, a restarted
+# benchmark resumes killed runs and skips finished ones (removed once the instance is done)
+CHECKPOINT_DIR = os.path.join("output", "checkpoints")
+CHECKPOINT_INTERVAL = 60
+
 # ========================= MAIN =========================
 def main():
     for i in range(0,10):
         # Initialize
         instance_name = benchmark_instances[i]
         print("\n",instance_name)
-        instance = vrplib.read_instance("instances/" + instance_name)
+        instance = load_instance(instance_name, distances=DISTANCES)
         bks = get_bks(instance_name)
         name_no_ext = instance_name.lower().replace(".vrp", "")
         k = int(name_no_ext.split("k")[1])
@@ -59,10 +69,11 @@ def main():
         seeds = list(range(1, n_iter + 1))
         start_all = time.time()
 
-        # Run n_iter in Parallel via Multiprocessing
-        with Pool(processes=min(cpu_count(), n_iter)) as pool:
-            args = [(seed, instance_name, bks, n, k) for seed in seeds]
-            all_results = pool.starmap(run_iteration, args)
+        # Run n_iter in Parallel via Multiprocessing, the workers share the loaded instance
+        with SharedInstance(instance) as shared:
+            with Pool(processes=min(cpu_count(), n_iter), initializer=init_worker, initargs=(shared.spec,)) as pool:
+                args = [(seed, bks, n, k) for seed in seeds]
+                all_results = pool.starmap(run_iteration, args)
 
         # Aggregate Results
         aggregated = {}
@@ -118,8 +129,10 @@ def main():
         with open(json_filename, "w") as f:
             json.dump(results_list, f, indent=4)
 
+        shutil.rmtree(os.path.join(CHECKPOINT_DIR, instance["name"]), ignore_errors=True)
+
 # ========================= RUN SINGLE ITERATION =========================
-def run_iteration(iter_seed, instance_name, bks, n, k):
+def run_iteration(iter_seed, bks, n, k):
     # Setting the seeds like this ensures that the result are reproducible
     random.seed(iter_seed)
     np.random.seed(iter_seed)
@@ -132,10 +145,16 @@ def run_iteration(iter_seed, instance_name, bks, n, k):
         print(f"{label} {dashes} ✔️   -----")
 
     results = {}
+    instance = worker_instance()
+
+    def checkpoint(method):
+        # elapsed_before is the runtime saved by an interrupted earlier run, the timers below include it
+        return Checkpoint(os.path.join(CHECKPOINT_DIR, instance["name"], f"{iter_seed}-{method}.pkl"),
+                          interval=CHECKPOINT_INTERVAL)
     
     # Random Initial Solution
     start = time.time()
-    random_routes, instance = generate_random_solution(instance_name)
+    random_routes = random_solution(instance)
     cost_rand = compute_total_cost(random_routes, instance["edge_weight"])
     elapsed = round((time.time() - start) / 60, 4)
     results["Random"] = (cost_rand, elapsed)
@@ -143,7 +162,9 @@ def run_iteration(iter_seed, instance_name, bks, n, k):
 
     # Iterated Local Search
     start = time.time()
-    ils_routes = iterated_local_search(deepcopy(instance), deepcopy(random_routes), ls=hybrid_ls, destroy_factor=0.1)
+    ils_checkpoint = checkpoint("ILS")
+    ils_routes = iterated_local_search(instance, deepcopy(random_routes), ls=hybrid_ls, destroy_factor=0.1, checkpoint=ils_checkpoint)
+    start -= ils_checkpoint.elapsed_before
     cost_ils = compute_total_cost(ils_routes, instance["edge_weight"])
     elapsed = round((time.time() - start) / 60, 4)
     results["ILS"] = (cost_ils, elapsed)
@@ -151,7 +172,9 @@ def run_iteration(iter_seed, instance_name, bks, n, k):
 
     # Standalone Simulated Annealing
     start = time.time()
-    sa_routes = simulated_annealing(deepcopy(instance), deepcopy(random_routes))
+    sa_checkpoint = checkpoint("SA")
+    sa_routes = simulated_annealing(instance, deepcopy(random_routes), checkpoint=sa_checkpoint)
+    start -= sa_checkpoint.elapsed_before
     cost_sa = compute_total_cost(sa_routes, instance["edge_weight"])
     elapsed = round((time.time() - start) / 60, 4)
     results["SA"] = (cost_sa, elapsed)
@@ -159,9 +182,11 @@ def run_iteration(iter_seed, instance_name, bks, n, k):
 
     # Hybrid LS + Simulated Annealing + Hybrid LS
     start = time.time()
-    ls_routes = hybrid_ls(deepcopy(instance), deepcopy(random_routes))
-    ls_sa_routes = simulated_annealing(deepcopy(instance), ls_routes)
-    ls_sa_ls_routes = hybrid_ls(deepcopy(instance), ls_sa_routes)
+    ls_routes = hybrid_ls(instance, deepcopy(random_routes))
+    ls_sa_checkpoint = checkpoint("LS+SA")
+    ls_sa_routes = simulated_annealing(instance, ls_routes, checkpoint=ls_sa_checkpoint)
+    start -= ls_sa_checkpoint.elapsed_before
+    ls_sa_ls_routes = hybrid_ls(instance, ls_sa_routes)
     cost_ls_sa_ls = compute_total_cost(ls_sa_ls_routes, instance["edge_weight"])
     elapsed = round((time.time() - start) / 60, 4)
     results["LS+SA+LS"] = (cost_ls_sa_ls, elapsed)
@@ -169,14 +194,16 @@ def run_iteration(iter_seed, instance_name, bks, n, k):
 
     # Tabu Search
     start = time.time()
-    tabu_routes = tabu_search(deepcopy(instance), deepcopy(random_routes))
+    tabu_checkpoint = checkpoint("Tabu")
+    tabu_routes = tabu_search(instance, deepcopy(random_routes), checkpoint=tabu_checkpoint)
+    start -= tabu_checkpoint.elapsed_before
     cost_tabu = compute_total_cost(tabu_routes, instance["edge_weight"])
     elapsed1 = round((time.time() - start) / 60, 4)
     results["Tabu"] = (cost_tabu, elapsed1)
     print_aligned(f"Tabu Solution Iteration: {iter_seed}")
 
     # Tabu Search + Hybrid LS
-    tabu_hls_routes = hybrid_ls(deepcopy(instance), tabu_routes)
+    tabu_hls_routes = hybrid_ls(instance, tabu_routes)
     cost_tabu_hls = compute_total_cost(tabu_hls_routes, instance["edge_weight"])
     elapsed2 = round((time.time() - start) / 60, 4)
     results["Tabu+LS"] = (cost_tabu_hls, elapsed2)
@@ -184,44 +211,54 @@ def run_iteration(iter_seed, instance_name, bks, n, k):
 
     # Fast LNS
     start = time.time()
-    fast_lns_routes = fast_lns(deepcopy(instance), deepcopy(random_routes))
+    fast_lns_checkpoint = checkpoint("Fast LNS")
+    fast_lns_routes = fast_lns(instance, deepcopy(random_routes), checkpoint=fast_lns_checkpoint)
+    start -= fast_lns_checkpoint.elapsed_before
     cost_fast_lns = compute_total_cost(fast_lns_routes, instance["edge_weight"])
     elapsed1 = round((time.time() - start) / 60, 4)
     results["Fast LNS"] = (cost_fast_lns, elapsed1)
     print_aligned(f"Fast LNS Solution Iteration: {iter_seed}")
 
     # Fast LNS + ILS
-    fast_lns_ils_routes = iterated_local_search(deepcopy(instance), fast_lns_routes)
+    fast_lns_ils_checkpoint = checkpoint("Fast LNS + ILS")
+    fast_lns_ils_routes = iterated_local_search(instance, fast_lns_routes, checkpoint=fast_lns_ils_checkpoint)
+    start -= fast_lns_ils_checkpoint.elapsed_before
     cost_fast_lns_ils = compute_total_cost(fast_lns_ils_routes, instance["edge_weight"])
     elapsed2 = round((time.time() - start) / 60, 4)
     results["Fast LNS + ILS"] = (cost_fast_lns_ils, elapsed2)
     print_aligned(f"Fast LNS + ILS Solution Iteration: {iter_seed}")
 
-    """# Smart LNS
+    # Smart LNS
     start = time.time()
-    smart_lns_routes = smart_lns(deepcopy(instance), deepcopy(random_routes))
+    smart_lns_checkpoint = checkpoint("Smart LNS")
+    smart_lns_routes = smart_lns(instance, deepcopy(random_routes), checkpoint=smart_lns_checkpoint)
+    start -= smart_lns_checkpoint.elapsed_before
     cost_smart_lns = compute_total_cost(smart_lns_routes, instance["edge_weight"])
     elapsed1 = round((time.time() - start) / 60, 4)
     results["Smart LNS"] = (cost_smart_lns, elapsed1)
     print_aligned(f"Smart LNS Solution Iteration: {iter_seed}")
 
     # Smart LNS + ILS
-    smart_lns_ils_routes = iterated_local_search(deepcopy(instance), smart_lns_routes)
+    smart_lns_ils_checkpoint = checkpoint("Smart LNS + ILS")
+    smart_lns_ils_routes = iterated_local_search(instance, smart_lns_routes, checkpoint=smart_lns_ils_checkpoint)
+    start -= smart_lns_ils_checkpoint.elapsed_before
     cost_smart_lns_ils = compute_total_cost(smart_lns_ils_routes, instance["edge_weight"])
     elapsed2 = round((time.time() - start) / 60, 4)
     results["Smart LNS + ILS"] = (cost_smart_lns_ils, elapsed2)
-    print_aligned(f"Smart LNS + ILS Solution Iteration: {iter_seed}")"""
+    print_aligned(f"Smart LNS + ILS Solution Iteration: {iter_seed}")
 
     # Genetic Algorithm
     start = time.time()
-    routes_ga = genetic_algorithm(deepcopy(instance), 40, n*5)
+    ga_checkpoint = checkpoint("GA")
+    routes_ga = genetic_algorithm(instance, 40, n*5, checkpoint=ga_checkpoint)
+    start -= ga_checkpoint.elapsed_before
     cost_ga = compute_total_cost(routes_ga, instance["edge_weight"])
     elapsed1 = round((time.time() - start) / 60, 4)
     results["GA"] = (cost_ga, elapsed1)
     print_aligned(f"GA Solution Iteration: {iter_seed}")
 
     # GA + Hybrid LS
-    routes_ga_hls = hybrid_ls(deepcopy(instance), routes_ga, n)
+    routes_ga_hls = hybrid_ls(instance, routes_ga, n)
     cost_ga_hls = compute_total_cost(routes_ga_hls, instance["edge_weight"])
     elapsed2 = round((time.time() - start) / 60, 4)
     results["GA+LS"] = (cost_ga_hls, elapsed2)
@@ -1,5 +1,5 @@
-import vrplib
 import random
+from utils.utils import load_instance
 
 def generate_random_solution(instance_name):
     """
@@ -10,8 +10,17 @@ def generate_random_solution(instance_name):
         Dict[str, Any]: instance subject to analysis
     """
     # load instance
-    instance = vrplib.read_instance("instances/" + instance_name)
+    instance = load_instance(instance_name)
+    return random_solution(instance), instance
 
+def random_solution(instance):
+    """
+    Generates a random solution for an already loaded instance: the customers are shuffled
+    and a new route is opened whenever the next one does not fit
+
+    Return:
+        List[List[int]]: random solution for VRP
+    """
     # load parameters
     capacity = instance["capacity"]
     demands = instance["demand"]  # demand[0] is depot
@@ -35,4 +44,4 @@ def generate_random_solution(instance_name):
     if current_route:
         routes.append(current_route)
 
-    return routes, instance
+    return routes
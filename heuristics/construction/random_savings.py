@@ -23,7 +23,7 @@ def randomized_savings(instance, alpha=0.3):
     for i in customers:
         for j in customers:
             if i < j:
-                saving = edge_weight[0][i] + edge_weight[0][j] - edge_weight[i][j]
+                saving = edge_weight[0, i] + edge_weight[0, j] - edge_weight[i, j]
                 savings.append((saving, i, j))
     savings.sort(reverse=True)
 
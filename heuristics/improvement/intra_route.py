@@ -0,0 +1,178 @@
+import numpy as np
+from utils.budget import Budget
+
+# Number of nearest nodes of the same route scanned per node
+INTRA_GRANULARITY = 10
+
+
+def optimize_route(route, edge_weight, granularity=INTRA_GRANULARITY, max_segment=3, or_3opt=False, max_passes=None,
+                   budget=None):
+    """
+    Intra-route local search of a single route (a TSP through the depot) until a local optimum:
+        2-opt:   new edge (a, b) between a node and one of its granularity-nearest nodes,
+                 the path in between is reversed
+        Or-opt:  a segment of 1 to max_segment customers starting or ending at a is moved next to b,
+                 in either orientation
+        Or-3opt: (optional) the same segment moves without the length limit
+    The route is held as local indices into a (len(route)+1) square distance block (index 0 = depot)
+    with a position array, so every move is evaluated in O(1) from the edges it changes.
+    max_passes: optional limit on the number of improving passes over the nodes
+    budget: optional Budget, checked between the passes
+
+    Return:
+        List[int]: improved route
+        Float: length of the route (depot -> route -> depot)
+    """
+    m = len(route)
+    if m == 0:
+        return [], 0.0
+    nodes = np.array([0] + list(route))
+    dist = np.asarray(edge_weight[nodes[:, None], nodes[None, :]], dtype=np.float64)
+    if budget is None:
+        budget = Budget()
+    if m >= 3:
+        k = min(granularity, m)
+        ranked = dist + np.diag(np.full(m + 1, np.inf))
+        neighbors = np.argsort(ranked, axis=1, kind="stable")[:, :k].tolist()
+        max_length = m if or_3opt else max_segment
+        tour = _IntraRoute(dist.tolist(), neighbors, max_length)
+        passes = 0
+        while (max_passes is None or passes < max_passes) and not budget.exhausted() and tour.improve():
+            passes += 1
+        order = tour.tour[:-1]
+    else:
+        order = list(range(m + 1))
+    legs = dist[order, order[1:] + order[:1]]
+    return nodes[order[1:]].tolist(), float(legs.sum())
+
+
+def optimize_routes(routes, edge_weight, granularity=INTRA_GRANULARITY, max_segment=3, or_3opt=False, max_passes=None,
+                    budget=None):
+    """
+    Runs optimize_route on every route of a solution (e.g. to educate the children of the GA)
+
+    Return:
+        List[List[int]]: improved routes
+        List[float]: length of every route
+    """
+    results = [optimize_route(route, edge_weight, granularity, max_segment, or_3opt, max_passes, budget)
+               for route in routes]
+    return [route for route, _ in results], [length for _, length in results]
+
+
+class _IntraRoute:
+    """
+    Closed tour over local indices with O(1) move evaluation: tour[0] = tour[-1] = 0 is the depot
+    (it never moves), pos[v] is the position of v in tour. Don't-look bits skip the nodes whose
+    tour neighbors did not change since they were last scanned without success.
+    """
+
+    def __init__(self, d, neighbors, max_length):
+        self.d = d
+        self.neighbors = neighbors
+        self.max_length = max_length
+        self.tour = list(range(len(d))) + [0]
+        self.pos = list(range(len(d)))
+        self.dont_look = [False] * len(d)
+
+    def improve(self):
+        """
+        One first-improvement pass over all nodes
+
+        Return:
+            bool: true if a move was applied
+        """
+        improved = False
+        for a in range(len(self.pos)):
+            if self.dont_look[a]:
+                continue
+            self.dont_look[a] = True
+            for b in self.neighbors[a]:
+                if self.two_opt(a, b) or self.or_opt(a, b):
+                    improved = True
+                    break
+        return improved
+
+    def pred(self, a):
+        return self.tour[self.pos[a] - 1] if a else self.tour[-2]
+
+    def two_opt(self, a, b):
+        """
+        Applies the best improving 2-opt creating the edge (a, b): the other new edge joins
+        the successors (or the predecessors) of a and b
+        """
+        d, tour, pos = self.d, self.tour, self.pos
+        best_delta, best_ends = -1e-9, None
+        for x, y in ((a, b), (self.pred(a), self.pred(b))):
+            i, j = pos[x], pos[y]
+            if i > j:
+                x, y, i, j = y, x, j, i
+            sx, sy = tour[i + 1], tour[j + 1]
+            if sx == y:
+                continue
+            delta = d[x][y] + d[sx][sy] - d[x][sx] - d[y][sy]
+            if delta < best_delta:
+                best_delta, best_ends = delta, (i, j)
+        if best_ends is None:
+            return False
+        i, j = best_ends
+        tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+        self._reindex(i, j + 2)
+        return True
+
+    def or_opt(self, a, b):
+        """
+        Applies the best improving segment move that creates the edge (a, b), a being the first
+        or the last customer of the segment
+        """
+        if a == 0:
+            return False  # the depot never moves
+        d, tour, pos = self.d, self.tour, self.pos
+        last_pos = len(tour) - 2  # position of the last customer
+        pa, pb = pos[a], pos[b]
+        # the edge (a, b) is created by placing a next to b, on either side
+        places = ((b, tour[pb + 1]), (self.pred(b), b))
+        d_a = d[a]
+        best_delta, best_move = -1e-9, None
+        for length in range(1, min(self.max_length, last_pos - 1) + 1):
+            # a first: the segment is tour[pa:pa+length], a last: tour[pa-length+1:pa+1]
+            for i, j, a_first in ((pa, pa + length - 1, True), (pa - length + 1, pa, False)):
+                if i < 1 or j > last_pos or i <= pb <= j or (length == 1 and not a_first):
+                    continue
+                first, last = tour[i], tour[j]
+                prev, next = tour[i - 1], tour[j + 1]
+                removed = d[prev][first] + d[last][next] - d[prev][next]
+                other = last if a_first else first
+                d_other = d[other]
+                for p, q in places:
+                    if q == first or p == last:
+                        continue  # (prev, first) and (last, next) disappear with the segment
+                    # a is placed on the side of b, the other end of the segment on the other side
+                    if p == b:
+                        added = d_a[p] + d_other[q]
+                    else:
+                        added = d_other[p] + d_a[q]
+                    delta = added - d[p][q] - removed
+                    if delta < best_delta:
+                        best_delta, best_move = delta, (i, j, p, (p == b) != a_first)
+        if best_move is None:
+            return False
+        i, j, p, reverse = best_move
+        segment = tour[i:j + 1]
+        if reverse:
+            segment.reverse()
+        del tour[i:j + 1]
+        k = tour.index(p) + 1
+        tour[k:k] = segment
+        self._reindex(min(i, k) - 1, max(j, k + j - i) + 2)
+        return True
+
+    def _reindex(self, start, end):
+        """
+        Re-indexes tour[start:end] and resets the don't-look bits of these nodes
+        """
+        tour, pos, dont_look = self.tour, self.pos, self.dont_look
+        for p in range(max(start, 0), min(end, len(tour) - 1)):
+            v = tour[p]
+            pos[v] = p
+            dont_look[v] = False
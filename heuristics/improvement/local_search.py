@@ -0,0 +1,211 @@
+from utils.neighbors import get_neighbors
+from utils.distances import improvement_tolerance
+from utils.budget import Budget
+
+# Number of nearest neighbors scanned per customer (as in HGS)
+LS_GRANULARITY = 20
+
+
+class LocalSearch:
+    """
+    Deterministic granular local search for the VRP.
+
+    For every customer u and every v among its granularity-nearest neighbors it evaluates:
+        relocate:  u right after v, u right before v
+        swap:      u and v trade places
+        2-opt:     reverse the path between u and v (same route)
+        2-opt*:    exchange the tails of the routes of u and v, both ways of reconnecting (different routes)
+    All deltas and capacity checks are O(1) (prefix loads are kept per customer).
+
+    Don't-look bits: the moves of a customer u only depend on its route and the routes of its
+    neighbors, so u is skipped until one of these routes changes. Passes after the first one only
+    revisit the regions touched by the last improvements, and the search ends in a local optimum.
+    """
+
+    def __init__(self, instance, routes, granularity=LS_GRANULARITY):
+        n = instance["dimension"]
+        self.edge_weight = instance["edge_weight"]
+        self.tolerance = improvement_tolerance(self.edge_weight)
+        self.capacity = instance["capacity"]
+        self.demand = instance["demand"].tolist()
+        self.neighbors = get_neighbors(instance, granularity).tolist()
+        # watchers[v]: the customers having v in their neighbor list
+        self.watchers = [[] for _ in range(n)]
+        for u in range(1, n):
+            for v in self.neighbors[u]:
+                self.watchers[v].append(u)
+        self.routes = [list(route) for route in routes]
+        self.route_of = [-1] * n
+        self.position = [-1] * n
+        self.pred = [0] * n
+        self.succ = [0] * n
+        self.cum_load = [0] * n
+        self.loads = [0] * len(self.routes)
+        self.dont_look = [True] + [False] * (n - 1)
+        for r_idx in range(len(self.routes)):
+            self.refresh(r_idx)
+
+    def refresh(self, r_idx):
+        """
+        Re-indexes route r_idx after it was modified and resets the don't-look bits of its customers
+        and of the customers having one of them as a neighbor
+        """
+        route = self.routes[r_idx]
+        prev = 0
+        load = 0
+        for pos, cust in enumerate(route):
+            self.route_of[cust] = r_idx
+            self.position[cust] = pos
+            self.pred[cust] = prev
+            load += self.demand[cust]
+            self.cum_load[cust] = load
+            self.dont_look[cust] = False
+            if prev:
+                self.succ[prev] = cust
+            prev = cust
+        if prev:
+            self.succ[prev] = 0
+        self.loads[r_idx] = load
+        dont_look = self.dont_look
+        for cust in route:
+            for w in self.watchers[cust]:
+                dont_look[w] = False
+
+    def run(self, strategy="first", max_passes=None, budget=None):
+        """
+        Scans the customers until no improving move is left (or max_passes passes were made)
+        strategy: "first" applies the first improving move found for a customer,
+                  "best" the best one over all its neighbors and operators
+        budget: optional Budget, checked before every customer (the moves applied so far are kept)
+
+        Return:
+            List[List[int]]: local optimum (empty routes are dropped)
+        """
+        n = len(self.route_of)
+        if budget is None:
+            budget = Budget()
+        passes = 0
+        improved = True
+        while improved and (max_passes is None or passes < max_passes):
+            improved = False
+            for u in range(1, n):
+                if self.dont_look[u]:
+                    continue
+                if budget.exhausted():
+                    return [list(route) for route in self.routes if route]
+                while self.improve(u, strategy):
+                    improved = True
+                self.dont_look[u] = True
+            passes += 1
+        return [list(route) for route in self.routes if route]
+
+    def improve(self, u, strategy="first"):
+        """
+        Looks for an improving move around customer u and applies it
+
+        Return:
+            bool: true if a move was applied
+        """
+        d = self.edge_weight
+        demand = self.demand
+        capacity = self.capacity
+        loads = self.loads
+        cum_load = self.cum_load
+        route_of = self.route_of
+        pred = self.pred
+        succ = self.succ
+
+        ru = route_of[u]
+        pu, x = pred[u], succ[u]
+        d_u = demand[u]
+        d_pu_u, d_u_x = d[pu, u], d[u, x]
+        remove_u = d[pu, x] - d_pu_u - d_u_x
+
+        best_delta, best_move = -self.tolerance, None
+        for v in self.neighbors[u]:
+            rv = route_of[v]
+            pv, y = pred[v], succ[v]
+            d_v = demand[v]
+            d_pv_v, d_v_y = d[pv, v], d[v, y]
+            same_route = ru == rv
+            moves = []
+
+            # relocate u after v / before v
+            if same_route or loads[rv] + d_u <= capacity:
+                if y != u:
+                    moves.append((remove_u + d[v, u] + d[u, y] - d_v_y, "relocate", u, v, 1))
+                if x != v:
+                    moves.append((remove_u + d[pv, u] + d[u, v] - d_pv_v, "relocate", u, v, 0))
+
+            # swap u and v (adjacent customers are covered by relocate)
+            if v != x and v != pu and (same_route or (loads[ru] - d_u + d_v <= capacity and loads[rv] - d_v + d_u <= capacity)):
+                delta = (d[pu, v] + d[v, x] - d_pu_u - d_u_x) + (d[pv, u] + d[u, y] - d_pv_v - d_v_y)
+                moves.append((delta, "swap", u, v, None))
+
+            if same_route:
+                # 2-opt: new edges (a, b) and (succ a, succ b), the path in between is reversed
+                a, b = (u, v) if self.position[u] < self.position[v] else (v, u)
+                sa, sb = succ[a], succ[b]
+                if sa != b:
+                    moves.append((d[a, b] + d[sa, sb] - d[a, sa] - d[b, sb], "2opt", a, b, None))
+            else:
+                # 2-opt*: (u, x), (v, y) become (u, y), (v, x) or (u, v), (x, y)
+                if cum_load[u] + loads[rv] - cum_load[v] <= capacity and cum_load[v] + loads[ru] - cum_load[u] <= capacity:
+                    moves.append((d[u, y] + d[v, x] - d_u_x - d_v_y, "2opt*", u, v, 0))
+                if cum_load[u] + cum_load[v] <= capacity and loads[ru] - cum_load[u] + loads[rv] - cum_load[v] <= capacity:
+                    moves.append((d[u, v] + d[x, y] - d_u_x - d_v_y, "2opt*", u, v, 1))
+
+            for move in moves:
+                if move[0] < best_delta:
+                    best_delta, best_move = move[0], move
+                    if strategy == "first":
+                        break
+            if best_move is not None and strategy == "first":
+                break
+
+        if best_move is None:
+            return False
+        self.apply(*best_move[1:])
+        return True
+
+    def apply(self, kind, u, v, variant):
+        """
+        Applies a move found by improve and re-indexes the changed routes
+        """
+        ru, rv = self.route_of[u], self.route_of[v]
+        route_u, route_v = self.routes[ru], self.routes[rv]
+        pos_u, pos_v = self.position[u], self.position[v]
+
+        if kind == "relocate":
+            route_u.pop(pos_u)
+            if ru == rv and pos_u < pos_v:
+                pos_v -= 1
+            route_v.insert(pos_v + variant, u)
+        elif kind == "swap":
+            route_u[pos_u] = v
+            route_v[pos_v] = u
+        elif kind == "2opt":
+            route_u[pos_u + 1:pos_v + 1] = route_u[pos_u + 1:pos_v + 1][::-1]
+        elif variant == 0:
+            self.routes[ru] = route_u[:pos_u + 1] + route_v[pos_v + 1:]
+            self.routes[rv] = route_v[:pos_v + 1] + route_u[pos_u + 1:]
+        else:
+            self.routes[ru] = route_u[:pos_u + 1] + route_v[:pos_v + 1][::-1]
+            self.routes[rv] = route_u[pos_u + 1:][::-1] + route_v[pos_v + 1:]
+
+        self.refresh(ru)
+        if rv != ru:
+            self.refresh(rv)
+
+
+def local_search(instance, routes, granularity=LS_GRANULARITY, strategy="first", max_passes=None, budget=None):
+    """
+    Performs deterministic granular local search (relocate, swap, 2-opt, 2-opt*) until a local optimum
+    strategy: "first" or "best" improvement
+    max_passes: optional limit on the number of passes over the customers
+    budget: optional Budget, the search stops early once it is exhausted
+
+    Return:
+        List[List[int]]: local optimum of the VRP
+    """
+    return LocalSearch(instance, routes, granularity).run(strategy, max_passes, budget)
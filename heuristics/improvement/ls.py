@@ -1,71 +1,112 @@
 import random
 import copy
-from utils.utils import compute_total_cost
-from heuristics.metaheuristics.neighborhood_operators.two_opt import two_opt_move
-from heuristics.metaheuristics.neighborhood_operators.exchange import exchange_move
+from utils.utils import compute_total_cost, compute_route_loads
+from heuristics.metaheuristics.neighborhood_operators.two_opt import two_opt_move, apply_two_opt
+from heuristics.metaheuristics.neighborhood_operators.exchange import exchange_move, apply_exchange
+from utils.neighbors import get_neighbors, build_position_index, reindex_places, sample_granular_exchange
+from heuristics.improvement.local_search import local_search, LS_GRANULARITY
+from heuristics.improvement.intra_route import optimize_routes, INTRA_GRANULARITY
+from utils.distances import improvement_tolerance
+from utils.budget import Budget
 
-def ls_with_2opt(instance, routes, it=100):
+def ls_with_2opt(instance, routes, it=100, budget=None):
     """
     Performs local search solve the VRP problem
     Neighborhood operator: Two-Opt
+    budget: optional Budget, checked between the rounds of sampled moves
 
     Return:
         List[List[int]]: best found solution to VRP
     """
     current_sol = copy.deepcopy(routes)
     current_length = compute_total_cost(current_sol, instance["edge_weight"])
+    tolerance = improvement_tolerance(instance["edge_weight"])
+    if budget is None:
+        budget = Budget()
     
     improv = True
-    while improv:
+    while improv and not budget.exhausted():
         improv = False
         
         for r_idx in range(len(current_sol)):
             if len(current_sol[r_idx]) < 3:
                 continue  # skip too-short routes
             for _ in range(it):
-                neighbor, delta = two_opt_move(current_sol, r_idx, instance["edge_weight"])
-                neighbor_length = current_length + delta
-                if delta < 0:
-                    current_sol = copy.deepcopy(neighbor)
-                    current_length = neighbor_length
+                move, delta = two_opt_move(current_sol, r_idx, instance["edge_weight"])
+                if delta < -tolerance:
+                    apply_two_opt(current_sol, move)
+                    current_length += delta
                     improv = True
     return current_sol
 
-def ls_with_swaps(instance, routes, it=100):
+def ls_intra_route(instance, routes, it=100, granularity=INTRA_GRANULARITY, or_3opt=False, budget=None):
+    """
+    Performs local search on every route separately until a local optimum
+    Neighborhood operators: Two-Opt over the neighbor lists, Or-Opt (segments of 1-3 customers)
+    and optionally Or-3opt (segments of any length), see intra_route.py
+    Faster than ls_with_2opt on long routes, as no move is sampled at random
+    it: maximum number of passes over the nodes of every route
+    budget: optional Budget, checked between the passes (the remaining routes are left unchanged once it is exhausted)
+
+    Return:
+        List[List[int]]: best found solution to VRP
+    """
+    return optimize_routes(routes, instance["edge_weight"], granularity, or_3opt=or_3opt, max_passes=it,
+                           budget=budget)[0]
+
+def ls_with_swaps(instance, routes, it=100, granularity=None, budget=None):
     """
     Performs local search solve the VRP problem
     Neighborhood operator: Exchange
+    granularity: if set, swaps are only sampled between a customer and its granularity-nearest neighbors
+    budget: optional Budget, checked between the rounds of sampled moves
 
     Return:
         List[List[int]]: best found solution to VRP
     """
     current_sol = copy.deepcopy(routes)
     current_length = compute_total_cost(current_sol, instance["edge_weight"])
+    loads = compute_route_loads(current_sol, instance["demand"])
+    tolerance = improvement_tolerance(instance["edge_weight"])
+    if budget is None:
+        budget = Budget()
+
+    if granularity:
+        neighbors = get_neighbors(instance, granularity)
+        route_of, position = build_position_index(current_sol, instance["dimension"])
     
     improv = True
     iter = 1
-    while improv:
+    while improv and not budget.exhausted():
         improv = False
         for _ in range(it):
-            route_1_idx = random.randint(0,len(current_sol)-1)
-            route_2_idx = random.randint(0,len(current_sol)-1)
-            neighbor, delta = exchange_move(current_sol, route_1_idx, route_2_idx, instance)
-            neighbor_length = current_length + delta
-            if delta < 0:
-                current_sol = copy.deepcopy(neighbor)
-                current_length = neighbor_length
+            if granularity:
+                route_1_idx, index_1, route_2_idx, index_2 = sample_granular_exchange(current_sol, route_of, position, neighbors)
+            else:
+                route_1_idx = random.randint(0,len(current_sol)-1)
+                route_2_idx = random.randint(0,len(current_sol)-1)
+                index_1 = index_2 = None
+            move, delta = exchange_move(current_sol, route_1_idx, route_2_idx, instance, index_1, index_2, loads)
+            if delta < -tolerance:
+                apply_exchange(current_sol, move, instance["demand"], loads)
+                current_length += delta
                 improv = True
+                if granularity:
+                    # the two swapped customers trade places in the index
+                    reindex_places(current_sol, [move[:2], move[2:]], route_of, position)
         iter += 1
     return current_sol
 
-def hybrid_ls(instance, routes, it=100):
+def hybrid_ls(instance, routes, it=100, granularity=None, budget=None):
     """
     Performs local search solve the VRP problem
-    Neighborhood operator: combined use of Exchange and Two-Opt
+    Neighborhood operators: Relocate, Exchange, Two-Opt and Two-Opt*, scanned systematically
+    over the neighbor lists with don't-look bits (see local_search.py) until a local optimum
+    it: maximum number of passes over the customers
+    granularity: number of neighbors scanned per customer (default LS_GRANULARITY)
+    budget: optional Budget, checked before every customer of a pass
 
     Return:
         List[List[int]]: best found solution to VRP
     """
-    ls_inter_route = ls_with_swaps(instance, routes, it)
-    ls_intra_route = ls_with_2opt(instance, ls_inter_route, it)
-    return ls_intra_route
+    return local_search(instance, routes, granularity or LS_GRANULARITY, max_passes=it, budget=budget)
@@ -0,0 +1,156 @@
+import math
+import random
+from multiprocessing import Pool, cpu_count
+import numpy as np
+from utils.utils import compute_total_cost
+from utils.neighbors import compute_neighbors, NEIGHBOR_LIST_SIZE
+from heuristics.metaheuristics.diversifying_components.lns import fast_lns
+
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+
+def route_barycenters(instance, routes):
+    """
+    Return:
+        np.ndarray: (len(routes) x 2) mean coordinates of the customers of every route
+    """
+    if "node_coord" not in instance:
+        raise ValueError("Decomposition needs an instance with node coordinates")
+    coords = np.asarray(instance["node_coord"], dtype=np.float64)
+    return np.array([coords[route].mean(axis=0) for route in routes])
+
+
+def sector_partition(instance, routes, subproblem_size, offset=0.0):
+    """
+    Sorts the routes by the polar angle of their barycenter around the depot (starting at offset)
+    and cuts the sequence into groups of about subproblem_size customers
+
+    Return:
+        List[List[int]]: indices of the routes of every group
+    """
+    depot = np.asarray(instance["node_coord"][0], dtype=np.float64)
+    centers = route_barycenters(instance, routes) - depot
+    angles = (np.arctan2(centers[:, 1], centers[:, 0]) - offset) % (2 * math.pi)
+    groups, group, size = [], [], 0
+    for r_idx in np.argsort(angles, kind="stable").tolist():
+        group.append(r_idx)
+        size += len(routes[r_idx])
+        if size >= subproblem_size:
+            groups.append(group)
+            group, size = [], 0
+    if group:
+        groups.append(group)
+    return groups
+
+
+def barycenter_partition(instance, routes, subproblem_size, rng, max_iter=20):
+    """
+    Clusters the route barycenters with k-means into groups of about subproblem_size customers
+    (random initial centers, so every call gives another partition)
+
+    Return:
+        List[List[int]]: indices of the routes of every group
+    """
+    centers = route_barycenters(instance, routes)
+    n_customers = sum(len(route) for route in routes)
+    k = min(len(routes), max(1, round(n_customers / subproblem_size)))
+    means = centers[rng.choice(len(routes), k, replace=False)]
+    labels = None
+    for _ in range(max_iter):
+        dist = ((centers[:, None, :] - means[None, :, :]) ** 2).sum(axis=2)
+        new_labels = dist.argmin(axis=1)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = centers[labels == c]
+            if len(members):
+                means[c] = members.mean(axis=0)
+    return [group for group in (np.flatnonzero(labels == c).tolist() for c in range(k)) if group]
+
+
+def sub_instance(instance, customers):
+    """
+    Builds the CVRP over the depot and the given customers (node i of the sub-instance is
+    customers[i - 1] of the instance), with its own dense distance matrix and neighbor lists
+
+    Return:
+        Dict[str, Any]: sub-instance
+        np.ndarray: original node of every node of the sub-instance
+    """
+    nodes = np.concatenate(([0], np.asarray(customers, dtype=np.int64)))
+    sub = {"name": f"{instance.get('name', 'instance')}-sub{len(customers)}",
+           "dimension": len(nodes),
+           "capacity": instance["capacity"],
+           "demand": np.asarray(instance["demand"])[nodes],
+           "edge_weight": np.asarray(instance["edge_weight"][nodes[:, None], nodes[None, :]]),
+           "distances": instance.get("distances", "exact")}
+    if "node_coord" in instance:
+        sub["node_coord"] = np.asarray(instance["node_coord"])[nodes]
+    sub["neighbors"] = compute_neighbors(sub["edge_weight"], NEIGHBOR_LIST_SIZE)
+    return sub, nodes
+
+
+def _solve_subproblem(args):
+    solver, sub, sub_routes, seed, kwargs = args
+    random.seed(seed)
+    np.random.seed(seed)
+    new_routes = solver(sub, sub_routes, **kwargs)
+    return new_routes, compute_total_cost(new_routes, sub["edge_weight"])
+
+
+def decomposition(instance, routes, solver=fast_lns, iterations=5, subproblem_size=300, method="sector",
+                  processes=None, seed=0, **kwargs):
+    """
+    Decomposition for large instances: the routes of the current solution are grouped into
+    subproblems of about subproblem_size customers (by the polar sector of the route barycenters,
+    method="sector", or by k-means on the barycenters, method="barycenter"), every subproblem is
+    solved as a small CVRP by solver(sub_instance, sub_routes, **kwargs) in parallel processes and
+    the improved routes are stitched back. The partition rotates from one iteration to the next,
+    so routes that were in different subproblems end up together.
+
+    solver: any top-level function taking an instance and a solution, e.g. fast_lns, hybrid_ls, tabu_search
+
+    Return:
+        List[List[int]]: best found solution for the VRP problem
+    """
+    if method not in ("sector", "barycenter"):
+        raise ValueError(f"Unknown decomposition method {method}")
+    rng = np.random.default_rng(seed)
+    routes = [list(route) for route in routes if route]
+    if processes is None:
+        processes = cpu_count()
+    pool = Pool(processes) if processes > 1 else None
+
+    try:
+        for it in range(iterations):
+            if method == "sector":
+                groups = sector_partition(instance, routes, subproblem_size, offset=it * GOLDEN_ANGLE)
+            else:
+                groups = barycenter_partition(instance, routes, subproblem_size, rng)
+
+            tasks, maps = [], []
+            for group in groups:
+                customers = [cust for r_idx in group for cust in routes[r_idx]]
+                sub, nodes = sub_instance(instance, customers)
+                local = {int(cust): i for i, cust in enumerate(nodes.tolist())}
+                sub_routes = [[local[cust] for cust in routes[r_idx]] for r_idx in group]
+                tasks.append((solver, sub, sub_routes, int(rng.integers(2**31)), kwargs))
+                maps.append((nodes, compute_total_cost(sub_routes, sub["edge_weight"])))
+
+            results = pool.map(_solve_subproblem, tasks, chunksize=1) if pool else list(map(_solve_subproblem, tasks))
+
+            # Stitch the subproblems back, keeping the old routes where the solver did not improve
+            new_routes = []
+            for group, (nodes, old_cost), (sub_solution, cost) in zip(groups, maps, results):
+                if cost < old_cost:
+                    new_routes += [nodes[route].tolist() for route in sub_solution if route]
+                else:
+                    new_routes += [routes[r_idx] for r_idx in group]
+            routes = new_routes
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return routes
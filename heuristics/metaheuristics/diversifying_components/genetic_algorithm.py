@@ -1,19 +1,36 @@
 # Genetic Algorithm
 import numpy as np
-from utils.utils import compute_total_cost
 import copy
 import random
-from utils.tsp_solvers_for_GA import tsp_solver_nn
+from collections import Counter
+from utils.tsp_solvers_for_GA import tsp_solver_batch, tsp_lengths
+from heuristics.improvement.intra_route import optimize_routes
+from utils.split import split_linear, split_bounded, split_batch, cut_routes
+from utils.budget import Budget
 
+# Factor applied to the cost of infeasible individuals
+INFEASIBLE_PENALTY = 10
 
-def split(permutation, demand, capacity):
+
+def split(permutation, demand, capacity, edge_weight=None, max_vehicles=None):
     """
     Decoding function for the offsprings.
     Split the string of chromosomes into different routes.
 
+    With edge_weight the optimal Split of utils/split.py is used (at most max_vehicles
+    routes if set and possible), otherwise vehicles are filled greedily in chromosome order
+
     Return:
         List[List[int]]: solution of the VRP problem
     """
+    if edge_weight is not None:
+        routes = None
+        if max_vehicles is not None:
+            routes, _ = split_bounded(permutation, demand, capacity, edge_weight, max_vehicles)
+        if routes is None:
+            routes, _ = split_linear(permutation, demand, capacity, edge_weight)
+        return routes
+
     routes = []
     route = []
     load = 0
@@ -30,6 +47,253 @@ def split(permutation, demand, capacity):
     return routes
 
 
+def educate_routes(routes, instance, method="nn", cost=None):
+    """
+    Education of a decoded child: every route is re-sequenced with tsp_solver_batch, and keeps
+    its split order if the new tour is longer, so education never makes the child worse
+    cost: cost of the decoded routes if already known (e.g. from evaluate_population)
+
+    Return:
+        List[List[int]]: educated routes
+        List[float]: length of every educated route
+        Float: total length of the educated routes
+    """
+    new_routes, new_lengths = tsp_solver_batch(routes, instance["edge_weight"], method)
+    lengths = tsp_lengths(routes, instance["edge_weight"])
+    educated = []
+    educated_lengths = []
+    gain = 0.0
+    for route, length, new_route, new_length in zip(routes, lengths, new_routes, new_lengths):
+        if new_length <= length:
+            educated.append(new_route)
+            educated_lengths.append(new_length)
+            gain += length - new_length
+        else:
+            educated.append(list(route))
+            educated_lengths.append(length)
+    total_length = cost - gain if cost is not None else sum(educated_lengths)
+    return educated, educated_lengths, total_length
+
+
+def fingerprint_keys(n, seed=0):
+    """
+    Random 64-bit keys of the nodes and of the tour positions used by the fingerprints
+    (drawn from a separate generator, so the GA random stream is not affected)
+
+    Return:
+        Dict[str, np.ndarray]: "node" and "position" keys
+    """
+    rng = np.random.default_rng(seed)
+    return {"node": rng.integers(1, 2**63, size=n, dtype=np.uint64),
+            "position": rng.integers(1, 2**63, size=n, dtype=np.uint64) | np.uint64(1)}
+
+
+def tour_fingerprint(tour, keys):
+    """
+    Polynomial hash of a giant tour (identical chromosomes have identical fingerprints)
+
+    Return:
+        Int: 64-bit fingerprint
+    """
+    return int(np.sum(keys["node"][tour] * keys["position"][:len(tour)]))
+
+
+def routes_fingerprint(routes, keys):
+    """
+    Hash of the set of undirected edges of a solution, independent of the order and the
+    direction of the routes
+
+    Return:
+        Int: 64-bit fingerprint
+    """
+    tails = []
+    heads = []
+    for route in routes:
+        tails += [0] + route
+        heads += route + [0]
+    node_keys = keys["node"]
+    return int(np.sum(node_keys[tails] * node_keys[heads]))
+
+
+def population_index(n, capacity=64):
+    """
+    Bookkeeping of the population: fingerprint counters of the individuals, their
+    chromosomes as rows of a 2-D array and the pairwise Hamming distances of these rows
+    (rows are reused when individuals leave, the arrays grow when they are full)
+
+    Return:
+        Dict: population index
+    """
+    return {"tour": Counter(),
+            "routes": Counter(),
+            "cromosoms": np.zeros((capacity, n - 1), dtype=np.int32),
+            "dist": np.zeros((capacity, capacity), dtype=np.int32),
+            "active": np.zeros(capacity, dtype=bool)}
+
+
+def _free_slot(index):
+    """
+    Return:
+        Int: an unused row of the population index (the arrays are doubled if there is none)
+    """
+    free = np.flatnonzero(~index["active"])
+    if len(free):
+        return int(free[0])
+    capacity = len(index["active"])
+    index["cromosoms"] = np.concatenate((index["cromosoms"], np.zeros_like(index["cromosoms"])))
+    dist = np.zeros((2 * capacity, 2 * capacity), dtype=np.int32)
+    dist[:capacity, :capacity] = index["dist"]
+    index["dist"] = dist
+    index["active"] = np.concatenate((index["active"], np.zeros(capacity, dtype=bool)))
+    return capacity
+
+
+def add_to_index(index, individuals):
+    """
+    Adds the individuals to the population index, the distances of a new chromosome
+    to all others are computed in one vectorized pass
+    """
+    for individual in individuals:
+        index["tour"][individual["fingerprint"][0]] += 1
+        index["routes"][individual["fingerprint"][1]] += 1
+
+        slot = _free_slot(index)
+        row = np.asarray(individual["cromosoms"])
+        others = np.flatnonzero(index["active"])
+        dist = np.count_nonzero(index["cromosoms"][others] != row, axis=1)
+        index["cromosoms"][slot] = row
+        index["dist"][slot, others] = dist
+        index["dist"][others, slot] = dist
+        index["dist"][slot, slot] = 0
+        index["active"][slot] = True
+        individual["slot"] = slot
+
+
+def remove_from_index(index, individuals):
+    """
+    Removes the individuals from the population index
+    """
+    for individual in individuals:
+        for counter, fingerprint in zip((index["tour"], index["routes"]), individual["fingerprint"]):
+            counter[fingerprint] -= 1
+            if counter[fingerprint] <= 0:
+                del counter[fingerprint]
+        index["active"][individual["slot"]] = False
+
+
+def evaluate_population(cromosoms, instance, max_vehicles=None):
+    """
+    Decodes and scores a batch of chromosomes in one vectorized optimal split
+    max_vehicles: optional fleet limit, the chromosomes whose optimal split needs more routes are
+                  decoded again with split_bounded (they stay infeasible if the fleet is too small)
+
+    Return:
+        np.ndarray: cost of every chromosome
+        np.ndarray: feasibility flag of every chromosome
+        List[List[List[int]]]: decoded solution of every chromosome
+    """
+    costs, feasible, pred = split_batch(np.asarray(cromosoms), instance["demand"], instance["capacity"],
+                                        instance["edge_weight"], max_vehicles)
+    solutions = [cut_routes(cromosom, pred_row) for cromosom, pred_row in zip(cromosoms, pred)]
+    if max_vehicles is not None:
+        for r in np.flatnonzero(~feasible & np.isfinite(costs)).tolist():
+            routes, cost = split_bounded(cromosoms[r], instance["demand"], instance["capacity"],
+                                         instance["edge_weight"], max_vehicles)
+            if routes is not None:
+                solutions[r], costs[r], feasible[r] = routes, cost, True
+    return costs, feasible, solutions
+
+
+def random_individuals(instance, num, keys, max_vehicles=None):
+    """
+    Creates individuals with random chromosomes, evaluated as one batch
+
+    Return:
+        List[Dict]: new individuals
+    """
+    cromosoms = [np.random.permutation(list(range(1, instance["dimension"]))).tolist() for _ in range(num)]
+    return make_individuals(instance, cromosoms, keys, max_vehicles)
+
+
+def initial_population(instance, pop_size, keys, budget, batch_size=10, max_vehicles=None):
+    """
+    Creates the random initial population in batches of batch_size individuals, the construction
+    stops early once the budget is exhausted (the population keeps at least two individuals)
+
+    Return:
+        List[Dict]: initial population
+    """
+    pop = []
+    while len(pop) < pop_size and (len(pop) < 2 or not budget.exhausted()):
+        pop += random_individuals(instance, min(batch_size, pop_size - len(pop)), keys, max_vehicles)
+    return pop
+
+
+def make_individuals(instance, cromosoms, keys, max_vehicles=None):
+    """
+    Creates individuals from given chromosomes (giant tours), evaluated as one batch
+    (see evaluate_population), the cost of infeasible individuals is penalized
+
+    Return:
+        List[Dict]: new individuals
+    """
+    if not cromosoms:
+        return []
+    costs, feasible, solutions = evaluate_population(cromosoms, instance, max_vehicles)
+    costs = np.where(feasible, costs, INFEASIBLE_PENALTY * costs)
+    individuals = []
+    for cromosom, cost, feasibility, sol in zip(cromosoms, costs.tolist(), feasible.tolist(), solutions):
+        individuals.append({
+            "cromosoms": cromosom,
+            "Z": cost,
+            "Q": 0,
+            "div": 0,
+            "p": 0,
+            "range": [0, 1],
+            "feasible": feasibility,
+            "fingerprint": (tour_fingerprint(cromosom, keys), routes_fingerprint(sol, keys))})
+    return individuals
+
+
+def immigrate(pop, cromosoms, instance, keys, index, max_vehicles=None):
+    """
+    Island model: the chromosomes received from other islands replace the worst individuals
+    of the population (chromosomes already in the population are dropped)
+
+    Return:
+        List[Dict]: new population
+    """
+    new_individuals = []
+    seen = set()
+    for cromosom in cromosoms:
+        fingerprint = tour_fingerprint(cromosom, keys)
+        if fingerprint not in index["tour"] and fingerprint not in seen:
+            seen.add(fingerprint)
+            new_individuals.append(list(cromosom))
+    new_individuals = make_individuals(instance, new_individuals[:len(pop) - 1], keys, max_vehicles)
+    if not new_individuals:
+        return pop
+    pop = sorted(pop, key=lambda ind: ind["Z"])
+    remove_from_index(index, pop[-len(new_individuals):])
+    add_to_index(index, new_individuals)
+    return pop[:-len(new_individuals)] + new_individuals
+
+
+def best_individual_routes(pop, instance, max_vehicles=None):
+    """
+    Decodes the best feasible individual of the population, the incumbent when no child
+    improved on the initial population (e.g. when the budget expires early)
+
+    Return:
+        List[List[int]]: solution of the best feasible individual (None if there is none)
+    """
+    feasible = [ind for ind in pop if ind["feasible"]]
+    if not feasible:
+        return None
+    best = min(feasible, key=lambda ind: ind["Z"])
+    return evaluate_population([best["cromosoms"]], instance, max_vehicles)[2][0]
+
+
 def parent_selection(population):
     """
     Rank-based selection of parents
@@ -64,15 +328,13 @@ def order_crossover(parent1, parent2):
     child = [None] * size
     child[start:end + 1] = parent1[start:end + 1]
 
-    current_index = (end + 1) % size
-    parent2_index = (end + 1) % size
-
-    while None in child:
-        gene = parent2[parent2_index]
-        if gene not in child:
-            child[current_index] = gene
-            current_index = (current_index + 1) % size
-        parent2_index = (parent2_index + 1) % size
+    # the other positions are filled, from end + 1 on (wrapping around), with the genes of parent2
+    # read from end + 1 on that are not in the copied segment
+    copied = set(parent1[start:end + 1])
+    genes = [gene for gene in parent2[end + 1:] + parent2[:end + 1] if gene not in copied]
+    positions = list(range(end + 1, size)) + list(range(start))
+    for position, gene in zip(positions, genes):
+        child[position] = gene
 
     return child
 
@@ -97,14 +359,16 @@ def mutation(child, p = 0.2):
     return child
 
 
-def capacity_check(routes, instance):
+def capacity_check(routes, instance, max_vehicles=None):
     """
-    Checks feasibility of the solution.
+    Checks feasibility of the solution (and the fleet limit if max_vehicles is set).
 
     Return:
         bool: true if feasible, false viceversa
     """
     num_vehicles = len(routes)
+    if max_vehicles is not None and sum(1 for route in routes if route) > max_vehicles:
+        return False
     demands = instance["demand"]
     capacity = instance["capacity"]
     loads = [0 for _ in range(num_vehicles)]
@@ -126,18 +390,16 @@ def fitness_quality(population):
         individual["Q"] = 2*mu - individual["Z"]
 
 
-def diversity(population):
+def diversity(population, index):
     """
-    Computes fitness diversity of an individuals in the population.
+    Computes fitness diversity of an individuals in the population
+    (average Hamming distance to the other individuals, read from the population index)
     """
-    for individual in population:
-        div = 0
-        for other in population:
-            if individual == other:
-                continue
-            diff = sum([1 for a, b in zip(individual["cromosoms"], other["cromosoms"]) if a != b])
-            div += diff / len(individual["cromosoms"])
-        individual["div"] = div / (len(population) - 1)
+    slots = [individual["slot"] for individual in population]
+    n_genes = index["cromosoms"].shape[1]
+    div = index["dist"][np.ix_(slots, slots)].sum(axis=1) / (n_genes * (len(population) - 1))
+    for individual, d in zip(population, div.tolist()):
+        individual["div"] = d
 
 
 def calculate_combined_fitness(population, n_elite):
@@ -183,60 +445,77 @@ def calculate_probabilities(population):
 
 
 
-def genetic_algorithm(instance, pop_size, max_no_improv = 100):
+def genetic_algorithm(instance, pop_size, max_no_improv = 100, intra_route=False, migration=None, budget=None,
+                      on_improvement=None, checkpoint=None, educate="nn", max_vehicles=None):
     """
     Performs the genetic algorithm for VRP
+    max_vehicles: optional fleet limit, children are decoded with at most max_vehicles routes when possible
+                  (split_bounded), children with more routes are infeasible and penalized
+                  (None is returned if no feasible individual is found)
+    educate: sequencing of the routes of the children, "nn" nearest neighbor or "ci" cheapest insertion (see tsp_solver_batch)
+    intra_route: if set, the tours of the children are improved with 2-opt and Or-opt (see intra_route.py)
+    migration: island model hook, called as migration(it, pop, best_cost, best_sol) after every generation,
+               returns the chromosomes received from other islands (see island_model.py)
+    budget: optional Budget (time limit / evaluations), every child is one evaluation, the budget is checked
+            before every child and during the construction of the initial population
+    on_improvement: optional anytime callback on_improvement(elapsed, cost, routes) for every new best solution (see Budget.improved)
+    checkpoint: optional Checkpoint, saves the population and the best solution after every generation
+                once the interval has passed, a run started with an existing checkpoint resumes from it
 
     Return:
         List[List[int]]: best found solution for the VRP problem
     """
+    if budget is None:
+        budget = Budget()
+    state = checkpoint.load("genetic_algorithm") if checkpoint is not None else None
+    if state is not None and "result" in state:
+        return state["result"]
 
     # Initialize the population of individuals
-    pop = []
-    for i in range(pop_size):
-        individual = {
-        "cromosoms": np.random.permutation(list(range(1, instance["dimension"]))).tolist(),
-        "Z": 0,
-        "Q": 0,
-        "div": 0,
-        "p": 0,
-        "range": [0, 1],
-        "feasible": True}
-        sol = split(individual["cromosoms"], instance["demand"], instance["capacity"])
-        individual["Z"] = compute_total_cost(sol, instance["edge_weight"])
-        individual["feasible"] = capacity_check(sol, instance)
-        pop.append(individual)
-
-    fitness_quality(pop)
-    diversity(pop)
+    keys = fingerprint_keys(instance["dimension"])
     n_elite = 4 #from literature
-    calculate_combined_fitness(pop, n_elite)
-    calculate_probabilities(pop)
+    if state is None:
+        index = population_index(instance["dimension"]) # fingerprints and distances of the population
+        pop = initial_population(instance, pop_size, keys, budget, max_vehicles=max_vehicles)
+        add_to_index(index, pop)
+
+        fitness_quality(pop)
+        diversity(pop, index)
+        calculate_combined_fitness(pop, n_elite)
+        calculate_probabilities(pop)
 
     # Parameters
     p_rek = 0.7 # tuned
     p_mut = 0.2 # tuned
     gen_size = 25 # from literature
-    penalty = 10
+    penalty = INFEASIBLE_PENALTY
 
-    no_improv = 0
-    it = 1
     n = instance["dimension"]
-    best_cost = min(ind["Z"] for ind in pop)
+    if state is None:
+        no_improv = 0
+        it = 1
+        best_cost = min(ind["Z"] for ind in pop)
+        best_sol = None
+    else:
+        pop, index = state["pop"], state["index"]
+        no_improv, it = state["no_improv"], state["it"]
+        best_cost, best_sol = state["best_cost"], state["best_sol"]
 
     # Algorithm
-    while no_improv < max_no_improv: 
+    while no_improv < max_no_improv and not budget.exhausted(): 
 
         new_best_sol_found = False
 
         fitness_quality(pop)
-        # Diversity computed every 0.1*n iterations to reduce runtime
-        if it%round(0.1*n) == 0: # tuned
-            diversity(pop)
+        diversity(pop, index)
         calculate_combined_fitness(pop, n_elite)
         calculate_probabilities(pop)
     
+        children = []
+        children_fingerprints = set()
         for _ in range(gen_size):
+            if budget.exhausted():
+                break
             # Parent Selection
             parent_1 = parent_selection(pop)
             parent_2 = parent_selection(pop)
@@ -250,42 +529,59 @@ def genetic_algorithm(instance, pop_size, max_no_improv = 100):
                 mutation(child)
 
             # Check if the child is a clone
-            seen = set(tuple(ind["cromosoms"]) for ind in pop)
-            if tuple(child) in seen:
+            child_fingerprint = tour_fingerprint(child, keys)
+            if child_fingerprint in index["tour"] or child_fingerprint in children_fingerprints:
+                continue
+            children_fingerprints.add(child_fingerprint)
+            children.append(child)
+            budget.spend()
+
+        # Decode all children of the generation at once
+        costs, _, decoded = evaluate_population(children, instance, max_vehicles) if children else ([], None, [])
+
+        for routes, cost in zip(decoded, np.asarray(costs).tolist()):
+            if budget.exhausted():
+                break  # the children educated so far still join the population
+            # Educate the child with nearest neighbor (all routes at once) or cheapest insertion,
+            # starting from the split cost
+            new_routes, route_lengths, total_length = educate_routes(routes, instance, educate, cost)
+            if intra_route:
+                new_routes, route_lengths = optimize_routes(new_routes, instance["edge_weight"])
+                total_length = sum(route_lengths)
+
+            # Check if the educated child is a clone (same routes in another order)
+            cromosoms = [node for route in new_routes for node in route] # Encoding of the child
+            fingerprint = (tour_fingerprint(cromosoms, keys), routes_fingerprint(new_routes, keys))
+            if fingerprint[1] in index["routes"]:
                 continue
-
-            routes = split(child, instance["demand"], instance["capacity"])
-
-            # Educate the child with nearest neighbor
-            new_routes = [] 
-            total_length = 0
-            for route in routes:
-                sequenced_route, route_length = tsp_solver_nn(route, instance["edge_weight"])
-                new_routes.append(sequenced_route)  
-                total_length += route_length 
             
             # Check the capacity constraint
-            feasibility = capacity_check(new_routes, instance)
+            feasibility = capacity_check(new_routes, instance, max_vehicles)
             if feasibility is True:
                 if total_length < best_cost:
                     best_cost = total_length
                     best_sol = new_routes
                     new_best_sol_found = True
+                    budget.improved(on_improvement, best_cost, lambda: [route.copy() for route in best_sol])
             else:
                 total_length = penalty*total_length
             
             # Update population
-            pop.append({"cromosoms": [node for route in new_routes for node in route], # Encoding of the child
+            pop.append({"cromosoms": cromosoms,
                         "Z": total_length,
                         "Q":0, 
                         "div":0, 
                         "fitness_combined":0, 
                         "p":0, 
                         "range":[0,1], 
-                        "feasible": feasibility})
+                        "feasible": feasibility,
+                        "fingerprint": fingerprint})
+            add_to_index(index, pop[-1:])
 
         # Replacement
-        pop = sorted(pop, key=lambda ind: ind["Z"])[:pop_size+gen_size]
+        pop = sorted(pop, key=lambda ind: ind["Z"])
+        remove_from_index(index, pop[pop_size+gen_size:])
+        pop = pop[:pop_size+gen_size]
         
         # Improvement Management
         if new_best_sol_found is True:
@@ -293,25 +589,27 @@ def genetic_algorithm(instance, pop_size, max_no_improv = 100):
         else:
             no_improv += 1
 
+        # Migration: exchange individuals with the other islands
+        if migration is not None:
+            incoming = migration(it, pop, best_cost, best_sol)
+            if incoming:
+                pop = immigrate(pop, incoming, instance, keys, index, max_vehicles)
+
         # After 2.5*n iterations with no improvement, we replace some individuals with random solutions
         if no_improv > (2.5*n) and no_improv%round(0.25*n) == 0: # Tuned
             num_replace = int(pop_size * 0.2)
-            new_individuals = []
-            for _ in range(num_replace):
-                ind = {
-                    "cromosoms": np.random.permutation(list(range(1, instance["dimension"]))).tolist(),
-                    "Z": 0,
-                    "Q": 0,
-                    "div": 0,
-                    "p": 0,
-                    "range": [0, 1],
-                    "feasible": True}
-                sol = split(ind["cromosoms"], instance["demand"], instance["capacity"])
-                ind["Z"] = compute_total_cost(sol, instance["edge_weight"])
-                ind["feasible"] = capacity_check(sol, instance)
-                new_individuals.append(ind)
+            new_individuals = random_individuals(instance, num_replace, keys, max_vehicles)
+            remove_from_index(index, pop[-num_replace:])
+            add_to_index(index, new_individuals)
             pop = pop[:-num_replace] + new_individuals
 
         it +=1
-
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save("genetic_algorithm", {"pop": pop, "index": index, "no_improv": no_improv, "it": it,
+                                                  "best_cost": best_cost, "best_sol": best_sol})
+
+    if best_sol is None:
+        best_sol = best_individual_routes(pop, instance, max_vehicles)
+    if checkpoint is not None:
+        checkpoint.save("genetic_algorithm", {"result": best_sol})
     return best_sol
\ No newline at end of file
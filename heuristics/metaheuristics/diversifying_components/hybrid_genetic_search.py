@@ -1,56 +1,68 @@
 from heuristics.metaheuristics.diversifying_components.genetic_algorithm import split,fitness_quality, calculate_probabilities, parent_selection, order_crossover,capacity_check, calculate_combined_fitness, diversity
-from utils.tsp_solvers_for_GA import tsp_solver_nn
+from heuristics.metaheuristics.diversifying_components.genetic_algorithm import fingerprint_keys, tour_fingerprint, routes_fingerprint, population_index, add_to_index, remove_from_index, initial_population, immigrate, best_individual_routes, INFEASIBLE_PENALTY, educate_routes
 from heuristics.improvement.ls import hybrid_ls
-import numpy as np
 from utils.utils import compute_total_cost
+from utils.budget import Budget
 
-def HGS(instance, pop_size, max_no_improv = 100):
+def HGS(instance, pop_size, max_no_improv = 100, migration=None, budget=None, on_improvement=None, checkpoint=None,
+        educate="nn", max_vehicles=None):
     """
     Performs simplified hybrid genetic search for VRP
+    max_vehicles: optional fleet limit, see genetic_algorithm
+    educate: sequencing of the routes of the children before the local search, "nn" or "ci" (see genetic_algorithm)
+    migration: island model hook, called as migration(it, pop, best_cost, best_sol) after every generation,
+               returns the chromosomes received from other islands (see island_model.py)
+    budget: optional Budget (time limit / evaluations), every child is one evaluation, the budget is also
+            checked between the children of a generation, during the construction of the initial population
+            and inside the local search of the children
+    on_improvement: optional anytime callback on_improvement(elapsed, cost, routes) for every new best solution (see Budget.improved)
+    checkpoint: optional Checkpoint, saves the population and the best solution periodically (see genetic_algorithm)
 
     Return:
         List[List[int]]: best found solution for the VRP problem
     """
-    pop = [] 
-    for i in range(pop_size):
-        individual = {
-        "cromosoms": np.random.permutation(list(range(1, instance["dimension"]))).tolist(),
-        "Z": 0,
-        "f": 0,
-        "div": 0,
-        "fitness_combined": 0,
-        "p": 0,
-        "range": [0, 1],
-        "feasible": True}
-        sol = split(individual["cromosoms"], instance["demand"], instance["capacity"])
-        individual["Z"] = compute_total_cost(sol, instance["edge_weight"])
-        individual["feasible"] = capacity_check(sol, instance)
-        pop.append(individual)
-
-    fitness_quality(pop)
-    diversity(pop)
+    if budget is None:
+        budget = Budget()
+    state = checkpoint.load("HGS") if checkpoint is not None else None
+    if state is not None and "result" in state:
+        return state["result"]
+    keys = fingerprint_keys(instance["dimension"])
     n_elite = 4
-    calculate_combined_fitness(pop, n_elite)
-    calculate_probabilities(pop)
+    if state is None:
+        index = population_index(instance["dimension"]) # fingerprints and distances of the population
+        pop = initial_population(instance, pop_size, keys, budget, max_vehicles=max_vehicles)
+        add_to_index(index, pop)
+
+        fitness_quality(pop)
+        diversity(pop, index)
+        calculate_combined_fitness(pop, n_elite)
+        calculate_probabilities(pop)
     
     gen_size = 25
-    penalty = 10
-    no_improv = 0
-    it = 1
-    it_ls = 0
-    best_cost = min(ind["Z"] for ind in pop)
-    n = instance["dimension"]
+    penalty = INFEASIBLE_PENALTY
+    if state is None:
+        no_improv = 0
+        it = 1
+        it_ls = 0
+        best_cost = min(ind["Z"] for ind in pop)
+        best_sol = None
+    else:
+        pop, index = state["pop"], state["index"]
+        no_improv, it, it_ls = state["no_improv"], state["it"], state["it_ls"]
+        best_cost, best_sol = state["best_cost"], state["best_sol"]
 
     # Algorithm
-    while no_improv < max_no_improv: 
+    while no_improv < max_no_improv and not budget.exhausted(): 
         new_best_sol_found = False
         fitness_quality(pop)
-        if it%(0.1*n) == 0:
-            diversity(pop)
+        diversity(pop, index)
         calculate_combined_fitness(pop, n_elite)
         calculate_probabilities(pop)
         #print(f"\nIteration {it}")
         for _ in range(gen_size):
+            if budget.exhausted():
+                break  # the children educated so far still join the population
+            budget.spend()
 
             # Parent Selection
             parent_1 = parent_selection(pop)
@@ -60,57 +72,76 @@ def HGS(instance, pop_size, max_no_improv = 100):
             child = order_crossover(parent_1, parent_2)
 
             #Check if the child is a clone
-            seen = set(tuple(ind["cromosoms"]) for ind in pop)
-            if tuple(child) in seen:
+            if tour_fingerprint(child, keys) in index["tour"]:
                 continue
 
-            routes = split(child, instance["demand"], instance["capacity"])
+            routes = split(child, instance["demand"], instance["capacity"], instance["edge_weight"], max_vehicles)
 
-            # Educate child using Nearest Neighbor and Local Search
-            new_routes = [] 
-            total_length = 0
-            for route in routes:
-                sequenced_route, route_length = tsp_solver_nn(route, instance["edge_weight"])
-                new_routes.append(sequenced_route)
-                total_length += route_length  
+            # Educate child using Nearest Neighbor (all routes at once) or Cheapest Insertion and Local Search
+            new_routes, _, total_length = educate_routes(routes, instance, educate)
+
+            # Check if the educated child is a clone (same routes in another order)
+            cromosoms = [node for route in new_routes for node in route] # Encoding of the child educated with LS
+            fingerprint = (tour_fingerprint(cromosoms, keys), routes_fingerprint(new_routes, keys))
+            if fingerprint[1] in index["routes"]:
+                continue
 
             if  total_length > 1.5 *best_cost:
                 continue  # skip LS on bad offsprings
             else:
-                child_ls = hybrid_ls(instance, new_routes, min(10, 3 + it_ls))
+                child_ls = hybrid_ls(instance, new_routes, min(10, 3 + it_ls), budget=budget)
             
             total_length = compute_total_cost(child_ls, instance["edge_weight"])
 
             # Check the capacity constraint
-            feasibility = capacity_check(child_ls, instance)
+            feasibility = capacity_check(child_ls, instance, max_vehicles)
             if feasibility is True:
                 if total_length < best_cost:
                     best_cost = total_length
                     best_sol = child_ls
                     new_best_sol_found = True
+                    budget.improved(on_improvement, best_cost, lambda: [route.copy() for route in best_sol])
             else:
                 total_length = penalty*total_length # Penalty approach for infeasible solutions
             # Update population
-            pop.append({"cromosoms":[node for route in new_routes for node in route], # Encoding of the child educated with LS
+            pop.append({"cromosoms": cromosoms,
                         "Z": total_length, 
                         "f":0, 
                         "div":0, 
                         "fitness_combined":0, 
                         "p":0, 
                         "range":[0,1], 
-                        "feasible": feasibility})
+                        "feasible": feasibility,
+                        "fingerprint": fingerprint})
+            add_to_index(index, pop[-1:])
 
         # Replacement
-        pop = sorted(pop, key=lambda ind: ind["Z"])[:pop_size+gen_size]
+        pop = sorted(pop, key=lambda ind: ind["Z"])
+        remove_from_index(index, pop[pop_size+gen_size:])
+        pop = pop[:pop_size+gen_size]
         
         # Improvement Management
         if new_best_sol_found is True:
             no_improv = 0
         else:
             no_improv += 1
+
+        # Migration: exchange individuals with the other islands
+        if migration is not None:
+            incoming = migration(it, pop, best_cost, best_sol)
+            if incoming:
+                pop = immigrate(pop, incoming, instance, keys, index, max_vehicles)
+
         it +=1
         if it%50 == 0:
             it_ls += 1 # As the algorithm proceeds we increase the iterations of LS
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save("HGS", {"pop": pop, "index": index, "no_improv": no_improv, "it": it, "it_ls": it_ls,
+                                    "best_cost": best_cost, "best_sol": best_sol})
 
+    if best_sol is None:
+        best_sol = best_individual_routes(pop, instance, max_vehicles)
+    if checkpoint is not None:
+        checkpoint.save("HGS", {"result": best_sol})
     return best_sol
     
\ No newline at end of file
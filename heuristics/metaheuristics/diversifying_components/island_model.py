@@ -0,0 +1,90 @@
+import random
+import queue
+import multiprocessing as mp
+import numpy as np
+from heuristics.metaheuristics.diversifying_components.genetic_algorithm import genetic_algorithm
+from utils.parallel import SharedInstance, attach_instance, shared_register, publish_solution, read_register
+from utils.utils import compute_total_cost
+
+
+def _run_island(spec, algorithm, seed, pop_size, max_no_improv, inbox, outboxes, register,
+                migration_interval, n_migrants, kwargs):
+    """
+    Runs one island: the algorithm on its own population, migrating the best n_migrants
+    chromosomes to the outboxes every migration_interval generations
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    instance = attach_instance(spec)
+    for box in outboxes:
+        box.cancel_join_thread()  # an island may finish before its neighbors read its migrants
+
+    def migration(it, pop, best_cost, best_sol):
+        if best_sol is not None:
+            publish_solution(register, best_sol, best_cost)
+        if it % migration_interval:
+            return []
+        emigrants = [ind["cromosoms"] for ind in sorted(pop, key=lambda ind: ind["Z"])[:n_migrants]]
+        for box in outboxes:
+            box.put(emigrants)
+        incoming = []
+        while True:
+            try:
+                incoming += inbox.get_nowait()
+            except queue.Empty:
+                return incoming
+
+    best_sol = algorithm(instance, pop_size, max_no_improv, migration=migration, **kwargs)
+    if best_sol is not None:
+        publish_solution(register, best_sol, compute_total_cost(best_sol, instance["edge_weight"]))
+
+
+def island_model(instance, algorithm=genetic_algorithm, n_islands=None, pop_size=40, max_no_improv=100,
+                 migration_interval=10, n_migrants=2, topology="ring", seeds=None, **kwargs):
+    """
+    Island model for genetic_algorithm or HGS: one population per process, every migration_interval
+    generations each island sends its n_migrants best chromosomes to the next island (topology="ring")
+    or to all other islands (topology="broadcast"), the received ones replace the worst individuals.
+    Migration is asynchronous, islands never wait for each other. The best solution of all islands
+    is kept in a shared register. The instance is shared with the islands through shared memory.
+    seeds: one seed per island (default 1..n_islands), n_islands defaults to len(seeds) if seeds are given
+    and to the number of cores otherwise
+
+    Return:
+        List[List[int]]: best found solution for the VRP problem
+    """
+    if seeds is not None:
+        seeds = list(seeds)
+        if n_islands is None:
+            n_islands = len(seeds)
+    if n_islands is None:
+        n_islands = mp.cpu_count()
+    if seeds is None:
+        seeds = list(range(1, n_islands + 1))
+    if len(seeds) < n_islands:
+        raise ValueError(f"{n_islands} islands need {n_islands} seeds, got {len(seeds)}")
+    seeds = seeds[:n_islands]
+    if topology not in ("ring", "broadcast"):
+        raise ValueError(f"Unknown migration topology {topology}")
+
+    register = shared_register(instance["dimension"])
+    inboxes = [mp.Queue() for _ in range(n_islands)]
+    if topology == "ring":
+        outboxes = [[inboxes[(i + 1) % n_islands]] if n_islands > 1 else [] for i in range(n_islands)]
+    else:
+        outboxes = [[box for j, box in enumerate(inboxes) if j != i] for i in range(n_islands)]
+
+    with SharedInstance(instance) as shared:
+        islands = [mp.Process(target=_run_island,
+                              args=(shared.spec, algorithm, seed, pop_size, max_no_improv, inboxes[i], outboxes[i],
+                                    register, migration_interval, n_migrants, kwargs))
+                   for i, seed in enumerate(seeds)]
+        for island in islands:
+            island.start()
+        for island in islands:
+            island.join()
+
+    for island in islands:
+        if island.exitcode != 0:
+            raise RuntimeError(f"An island terminated with exit code {island.exitcode}")
+    return read_register(register)[0]
@@ -1,9 +1,17 @@
+import math
+import random
+import multiprocessing as mp
+import numpy as np
+from utils.solution import Solution
 from utils.utils import compute_total_cost
+from utils.budget import Budget
+from utils.parallel import SharedInstance, attach_instance, shared_register, publish_solution, read_register, register_cost
 from heuristics.metaheuristics.neighborhood_operators.remove import random_removal, worst_removal
 from heuristics.metaheuristics.neighborhood_operators.repair import greedy_repair, regret_repair
 
 
-def fast_lns(instance, routes, min_iter=250, destroy_frac=0.1): # destroy_frac finetuned
+def fast_lns(instance, routes, min_iter=250, destroy_frac=0.1, budget=None, on_improvement=None,
+             checkpoint=None): # destroy_frac finetuned
     """
     Performs Fast Large Neighborhood Search for VRP
 
@@ -11,32 +19,58 @@ def fast_lns(instance, routes, min_iter=250, destroy_frac=0.1): # destroy_frac f
     - Destroy Operator: random removal
     - Repair Operator: greedy repair
 
+    The search runs on an array-backed Solution, so destroy and repair only touch
+    the affected routes and costs come from the cached route costs
+
+    budget: optional Budget (time limit / evaluations), one destroy and repair round is one evaluation
+    on_improvement: optional anytime callback on_improvement(elapsed, cost, routes) for every new best
+                    solution, routes() returns a copy on demand, a truthy return stops the search (see Budget.improved)
+    checkpoint: optional Checkpoint, the current solution and iteration are saved periodically and
+                a run started with an existing checkpoint resumes from it
+
     Return:
         List[List[int]]: best found solution for the VRP problem
     """
-    current_solution = routes
-    best_solution = current_solution
-    best_cost = compute_total_cost(current_solution, instance["edge_weight"])
+    state = checkpoint.load("fast_lns") if checkpoint is not None else None
+    if state is not None and "result" in state:
+        return state["result"]
+    if state is None:
+        current_solution = Solution.from_routes(routes, instance)
+        it = 0
+    else:
+        current_solution = Solution.from_state(state["current"], instance)
+        it = state["it"]
+    best_cost = current_solution.cost()
 
     iterations = max(min_iter, instance["dimension"])
+    if budget is None:
+        budget = Budget()
 
-    for it in range(iterations):
+    while it < iterations and not budget.exhausted():
         # destroy initial solution
-        num_remove = int(destroy_frac * sum(len(r) for r in current_solution))
-        partial_solution, removed = random_removal(current_solution, num_remove)
+        num_remove = int(destroy_frac * (instance["dimension"] - 1))
+        partial_solution, removed = random_removal(current_solution.copy(), num_remove)
 
         # repair destroyed solution
         repaired = greedy_repair(instance, partial_solution, removed)
-        cost = compute_total_cost(repaired, instance["edge_weight"])
+        cost = repaired.cost()
 
         if cost < best_cost:
-            best_solution = repaired
             best_cost = cost
             current_solution = repaired
-
-    return best_solution
-
-def smart_lns(instance, routes, min_iter=250, destroy_frac=0.1): # destroy_frac finetuned
+            budget.improved(on_improvement, best_cost, current_solution.to_routes)
+        budget.spend()
+        it += 1
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save("fast_lns", {"current": current_solution.to_state(), "it": it})
+
+    result = current_solution.to_routes()
+    if checkpoint is not None:
+        checkpoint.save("fast_lns", {"result": result})
+    return result
+
+def smart_lns(instance, routes, min_iter=250, destroy_frac=0.1, p=None, budget=None, on_improvement=None,
+              checkpoint=None): # destroy_frac finetuned
     """
     Performs Smart Large Neighborhood Search for VRP
     
@@ -44,27 +78,128 @@ def smart_lns(instance, routes, min_iter=250, destroy_frac=0.1): # destroy_frac
     - Destroy Operator: worst removal
     - Repair Operator: regret repair
 
+    Like fast_lns, the search runs on an array-backed Solution
+
+    p: randomization of the worst removal (None = deterministic, see worst_removal)
+    budget: optional Budget (time limit / evaluations), see fast_lns
+    on_improvement: optional anytime callback, see fast_lns
+    checkpoint: optional Checkpoint, see fast_lns
+
     Return:
         List[List[int]]: best found solution for the VRP problem
     """
-    current_solution = routes
-    best_solution = current_solution
-    best_cost = compute_total_cost(current_solution, instance["edge_weight"])
+    state = checkpoint.load("smart_lns") if checkpoint is not None else None
+    if state is not None and "result" in state:
+        return state["result"]
+    if state is None:
+        current_solution = Solution.from_routes(routes, instance)
+        it = 0
+    else:
+        current_solution = Solution.from_state(state["current"], instance)
+        it = state["it"]
+    best_cost = current_solution.cost()
 
     iterations = max(min_iter, instance["dimension"])
+    if budget is None:
+        budget = Budget()
 
-    for it in range(iterations):
+    while it < iterations and not budget.exhausted():
         # destroy initial solution
-        num_remove = int(destroy_frac * sum(len(r) for r in current_solution))
-        partial_solution, removed = worst_removal(instance, current_solution, num_remove)
+        num_remove = int(destroy_frac * (instance["dimension"] - 1))
+        partial_solution, removed = worst_removal(instance, current_solution.copy(), num_remove, p)
 
         # repair destroyed solution
         repaired = regret_repair(instance, partial_solution, removed)
-        cost = compute_total_cost(repaired, instance["edge_weight"])
+        cost = repaired.cost()
 
         if cost < best_cost:
-            best_solution = repaired
             best_cost = cost
             current_solution = repaired
+            budget.improved(on_improvement, best_cost, current_solution.to_routes)
+        budget.spend()
+        it += 1
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save("smart_lns", {"current": current_solution.to_state(), "it": it})
 
-    return best_solution
\ No newline at end of file
+    result = current_solution.to_routes()
+    if checkpoint is not None:
+        checkpoint.save("smart_lns", {"result": result})
+    return result
+
+
+def _lns_worker(spec, routes, seed, iterations, num_remove, mode, p, sync_interval, register):
+    """
+    One worker of parallel_lns: destroy -> repair -> accept if improving on its own incumbent,
+    improvements are published to the shared register, and every sync_interval iterations the
+    worker restarts from the register if another worker found a better solution
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    instance = attach_instance(spec)
+    current_solution = Solution.from_routes(routes, instance)
+    best_cost = current_solution.cost()
+
+    for it in range(1, iterations + 1):
+        # re-sync with the shared incumbent
+        if it % sync_interval == 0 and register_cost(register) < best_cost:
+            shared_routes, _ = read_register(register)
+            current_solution = Solution.from_routes(shared_routes, instance)
+            best_cost = current_solution.cost()
+
+        if mode == "fast" or (mode == "mixed" and random.random() < 0.5):
+            partial_solution, removed = random_removal(current_solution.copy(), num_remove)
+            repaired = greedy_repair(instance, partial_solution, removed)
+        else:
+            partial_solution, removed = worst_removal(instance, current_solution.copy(), num_remove, p)
+            repaired = regret_repair(instance, partial_solution, removed)
+        cost = repaired.cost()
+
+        if cost < best_cost:
+            best_cost = cost
+            current_solution = repaired
+            publish_solution(register, current_solution.to_routes(), cost)
+
+
+def parallel_lns(instance, routes, n_workers=None, min_iter=250, destroy_frac=0.1, mode="fast", p=None,
+                 sync_interval=25, seeds=None):
+    """
+    Performs Large Neighborhood Search with n_workers processes sharing one incumbent
+
+    Every worker runs destroy -> repair -> accept from its own copy of the incumbent and publishes
+    improvements to a shared register (utils/parallel.py) without waiting for the others, every
+    sync_interval iterations it continues from the register if that holds a better solution.
+    The iterations of fast_lns/smart_lns are split among the workers.
+
+    mode: "fast" (random removal + greedy repair), "smart" (worst removal + regret repair)
+          or "mixed" (either one, drawn in every iteration)
+    p: randomization of the worst removal (see worst_removal)
+
+    Return:
+        List[List[int]]: best found solution for the VRP problem
+    """
+    if mode not in ("fast", "smart", "mixed"):
+        raise ValueError(f"Unknown LNS mode {mode}")
+    if n_workers is None:
+        n_workers = mp.cpu_count()
+    if seeds is None:
+        seeds = range(1, n_workers + 1)
+    seeds = list(seeds)[:n_workers]
+
+    iterations = math.ceil(max(min_iter, instance["dimension"]) / len(seeds))
+    num_remove = int(destroy_frac * (instance["dimension"] - 1))
+    register = shared_register(instance["dimension"])
+    publish_solution(register, routes, compute_total_cost(routes, instance["edge_weight"]))
+
+    with SharedInstance(instance) as shared:
+        workers = [mp.Process(target=_lns_worker,
+                              args=(shared.spec, routes, seed, iterations, num_remove, mode, p, sync_interval, register))
+                   for seed in seeds]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    for worker in workers:
+        if worker.exitcode != 0:
+            raise RuntimeError(f"An LNS worker terminated with exit code {worker.exitcode}")
+    return read_register(register)[0]
@@ -1,55 +1,86 @@
 # Simulated Annealing
-from utils.utils import compute_total_cost
+from utils.utils import compute_total_cost, compute_route_loads, compute_prefix_loads
 import numpy as np
 import time
-import random
 from heuristics.metaheuristics.neighborhood_operators.two_opt import two_opt_move
-from heuristics.metaheuristics.neighborhood_operators.exchange import exchange_move
+from heuristics.metaheuristics.neighborhood_operators.inter_route import INTER_ROUTE_OPERATORS, sample_inter_route_move, apply_inter_route_move
 import math
 import copy
+from utils.neighbors import get_neighbors, build_position_index
+from utils.budget import Budget
 
-def simulated_annealing(instance, routes, min_no_improvement=250, alpha=0.1, beta=0.9): # parameters tuned
+def simulated_annealing(instance, routes, min_no_improvement=250, alpha=0.1, beta=0.9, granularity=None,
+                        operators=INTER_ROUTE_OPERATORS, budget=None, on_improvement=None, checkpoint=None): # parameters tuned
     """
     Performs the simulated annealing for VRP
+    granularity: if set, the sampled moves are restricted to the granularity-nearest neighbors
+    operators: inter-route operators sampled in the neighborhood (exchange, relocate, two_opt_star, cross_exchange)
+    budget: optional Budget (time limit / evaluations), every sampled neighbor is one evaluation
+    on_improvement: optional anytime callback on_improvement(elapsed, cost, routes) for every new best solution (see Budget.improved)
+    checkpoint: optional Checkpoint, saves the current and best solutions and the temperature periodically (see fast_lns)
 
     Return:
         List[List[int]]: best found solution for the VRP problem
     """
     # Initialize
-    current_sol = copy.deepcopy(routes)
-    current_length = compute_total_cost(current_sol, instance["edge_weight"])
-    best_sol = current_sol
-    best_length = current_length
-
-    temperature = alpha * current_length
+    state = checkpoint.load("simulated_annealing") if checkpoint is not None else None
+    if state is not None and "result" in state:
+        return state["result"]
+    if state is None:
+        current_sol = copy.deepcopy(routes)
+        current_length = compute_total_cost(current_sol, instance["edge_weight"])
+        best_sol = current_sol
+        best_length = current_length
+        # Moves are applied in place, the best solution is only copied when we are about
+        # to leave it with a worsening move (instead of copying on every acceptance)
+        best_is_current = True
+        temperature = alpha * current_length
+        no_improv = 0
+    else:
+        current_sol, current_length = state["current"], state["current_length"]
+        best_is_current = state["best"] is None
+        best_sol = current_sol if best_is_current else state["best"]
+        best_length = state["best_length"]
+        temperature = state["temperature"]
+        no_improv = state["no_improv"]
+    demands = instance["demand"]
+    loads = compute_route_loads(current_sol, demands)
+    prefix_loads = compute_prefix_loads(current_sol, demands)
     cooling = beta
 
     n = instance["dimension"]
     max_no_improvement = max(min_no_improvement, 0.5*n)
 
-    no_improv = 0
-    while no_improv < max_no_improvement:
+    neighbors = route_of = position = None
+    if granularity:
+        neighbors = get_neighbors(instance, granularity)
+        route_of, position = build_position_index(current_sol, n)
+    if budget is None:
+        budget = Budget()
+
+    while no_improv < max_no_improvement and not budget.exhausted():
         improv = False
         # Exploration of the neighborhood
         for it in range(1):
-            r_idx_1 = random.randint(0,len(current_sol)-2)
-            r_idx_2 = random.randint(0,len(current_sol)-2)
-            neighbor, x = exchange_move(current_sol, r_idx_1, r_idx_2, instance)
-
-            neighbor_length = compute_total_cost(neighbor, instance["edge_weight"])
-            delta = neighbor_length - current_length
+            name, move, delta, _ = sample_inter_route_move(current_sol, instance, operators, loads, prefix_loads,
+                                                           neighbors, route_of, position)
+            neighbor_length = current_length + delta
             # If the neighbor improves the current solution, we update it
             if delta < 0:
                 improv = True
-                current_sol = neighbor.copy()
+                apply_inter_route_move(current_sol, name, move, demands, loads, prefix_loads, route_of, position)
                 current_length = neighbor_length
                 # If the neighbor is a new best solution, we save it
                 if current_length < best_length:
-                    best_sol = neighbor.copy()
                     best_length = neighbor_length
+                    best_is_current = True
+                    budget.improved(on_improvement, best_length, lambda: [route.copy() for route in current_sol if route])
             # Update of the current solution even in case of worse neighbors
-            elif np.random.random() <  math.exp(-delta / temperature):
-                current_sol = neighbor.copy()
+            elif np.random.random() <  math.exp(-delta / temperature) and move is not None:
+                if best_is_current:
+                    best_sol = [route.copy() for route in current_sol]
+                    best_is_current = False
+                apply_inter_route_move(current_sol, name, move, demands, loads, prefix_loads, route_of, position)
                 current_length = neighbor_length
         
         if improv:
@@ -57,5 +88,15 @@ def simulated_annealing(instance, routes, min_no_improvement=250, alpha=0.1, bet
         else:
             no_improv += 1
         temperature = max(temperature*cooling, 0.0001)
+        budget.spend()
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save("simulated_annealing", {"current": current_sol, "current_length": current_length,
+                                                    "best": None if best_is_current else best_sol, "best_length": best_length,
+                                                    "temperature": temperature, "no_improv": no_improv})
 
-    return best_sol
\ No newline at end of file
+    if best_is_current:
+        best_sol = current_sol
+    result = [route for route in best_sol if route]
+    if checkpoint is not None:
+        checkpoint.save("simulated_annealing", {"result": result})
+    return result
\ No newline at end of file
@@ -2,6 +2,7 @@ from heuristics.metaheuristics.neighborhood_operators.remove import random_remov
 from heuristics.metaheuristics.neighborhood_operators.repair import greedy_repair
 from heuristics.improvement.ls import hybrid_ls
 from utils.utils import compute_total_cost
+from utils.budget import Budget
 import copy
 import random
 
@@ -21,27 +22,45 @@ def perturb(instance, routes, destroy_factor=0.2):
     #     raise RuntimeError("❌ [ILS] Repair failed and returned None")
     return repaired
 
-def iterated_local_search(instance, initial_solution, ls=hybrid_ls, it=100, destroy_factor=0.2): # destroy_factor finetuned
+def iterated_local_search(instance, initial_solution, ls=hybrid_ls, it=100, destroy_factor=0.2, budget=None,
+                          on_improvement=None, checkpoint=None): # destroy_factor finetuned
     """
     Performs iterated local search to solve the VRP problem
+    budget: optional Budget (time limit / evaluations), every perturbation and local search is one evaluation,
+            the budget is checked between local search runs and passed to ls, which stops early once it is exhausted
+    on_improvement: optional anytime callback on_improvement(elapsed, cost, routes) for every new best solution (see Budget.improved)
+    checkpoint: optional Checkpoint, saves the current and best solutions periodically (see fast_lns)
 
     Return:
         List[List[int]]: best found solution to VRP
     """
-    current = ls(instance, copy.deepcopy(initial_solution), it)
-    current_cost = compute_total_cost(current, instance["edge_weight"])
-    best = current
-    best_cost = current_cost
+    state = checkpoint.load("iterated_local_search") if checkpoint is not None else None
+    if state is not None and "result" in state:
+        return state["result"]
+    if budget is None:
+        budget = Budget()
+    if state is None:
+        current = ls(instance, copy.deepcopy(initial_solution), it, budget=budget)
+        current_cost = compute_total_cost(current, instance["edge_weight"])
+        best = current
+        best_cost = current_cost
+        start = 0
+    else:
+        current, current_cost = state["current"], state["current_cost"]
+        best, best_cost = state["best"], state["best_cost"]
+        start = state["it"]
 
     # this helps to start ls with fewer iterations in early stages of ILS, where gains are found quickly
     base_ils_it = int(it / 5)
     max_ils_it = max(it, instance["dimension"])
 
-    for _ in range(it):
+    for _ in range(start, it):
+        if budget.exhausted():
+            break
         perturbed = perturb(instance, current, destroy_factor)
         # check_integrity(perturbed, instance)
         adaptive_it = int(base_ils_it + (max_ils_it - base_ils_it) * (_ / it))
-        improved = ls(instance, perturbed, it=adaptive_it)
+        improved = ls(instance, perturbed, it=adaptive_it, budget=budget)
         improved_cost = compute_total_cost(improved, instance["edge_weight"])
 
         if improved_cost < current_cost:
@@ -50,7 +69,14 @@ def iterated_local_search(instance, initial_solution, ls=hybrid_ls, it=100, dest
             if current_cost < best_cost:
                 best = current
                 best_cost = current_cost
-
+                budget.improved(on_improvement, best_cost, lambda: [route.copy() for route in best])
+        budget.spend()
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save("iterated_local_search", {"current": current, "current_cost": current_cost,
+                                                      "best": best, "best_cost": best_cost, "it": _ + 1})
+
+    if checkpoint is not None:
+        checkpoint.save("iterated_local_search", {"result": best})
     return best
 
 
@@ -1,23 +1,43 @@
-from utils.utils import compute_total_cost
-import random
+from utils.utils import compute_total_cost, compute_route_loads, compute_prefix_loads
 import math
 import copy
-from heuristics.metaheuristics.neighborhood_operators.exchange import exchange_move
+from heuristics.metaheuristics.neighborhood_operators.inter_route import INTER_ROUTE_OPERATORS, sample_inter_route_move, apply_inter_route_move
+from utils.neighbors import get_neighbors, build_position_index
+from utils.budget import Budget
 
 
-def tabu_search(instance, routes, max_no_improv = 100, size_neighborhood=None, max_length_tabu=None):
+def tabu_search(instance, routes, max_no_improv = 100, size_neighborhood=None, max_length_tabu=None, granularity=None,
+                operators=INTER_ROUTE_OPERATORS, budget=None, on_improvement=None, checkpoint=None):
     """
     Performs Tabu Search for VRP
+    granularity: if set, the sampled moves are restricted to the granularity-nearest neighbors
+    operators: inter-route operators sampled in the neighborhood (exchange, relocate, two_opt_star, cross_exchange)
+    budget: optional Budget (time limit / evaluations), every sampled neighbor is one evaluation
+    on_improvement: optional anytime callback on_improvement(elapsed, cost, routes) for every new best solution (see Budget.improved)
+    checkpoint: optional Checkpoint, saves the current and best solutions and the tabu list periodically (see fast_lns)
 
     Return:
         List[List[int]]: best found solution for the VRP problem
     """
-    current_sol = copy.deepcopy(routes) # A feasible solution to the minimization problem: x
-    current_best_sol = copy.deepcopy(routes) # Initial best solution x*
-    current_length = compute_total_cost(current_sol, instance["edge_weight"]) # Initial F(x)   
-    current_best_length = compute_total_cost(current_best_sol, instance["edge_weight"]) # Initial F(x*)
+    state = checkpoint.load("tabu_search") if checkpoint is not None else None
+    if state is not None and "result" in state:
+        return state["result"]
+    if state is None:
+        current_sol = copy.deepcopy(routes) # A feasible solution to the minimization problem: x
+        current_best_sol = copy.deepcopy(routes) # Initial best solution x*
+        current_length = compute_total_cost(current_sol, instance["edge_weight"]) # Initial F(x)   
+        current_best_length = compute_total_cost(current_best_sol, instance["edge_weight"]) # Initial F(x*)
+        tabu_list = []
+        improv = 0
+    else:
+        current_sol, current_best_sol = state["current"], state["best"]
+        current_length, current_best_length = state["current_length"], state["best_length"]
+        tabu_list = state["tabu_list"]
+        improv = state["improv"]
+
+    loads = compute_route_loads(current_sol, instance["demand"])
+    prefix_loads = compute_prefix_loads(current_sol, instance["demand"])
 
-    tabu_list = []
     n = instance["dimension"]
 
     iterations = max(max_no_improv, n)
@@ -27,41 +47,54 @@ def tabu_search(instance, routes, max_no_improv = 100, size_neighborhood=None, m
         size_neighborhood = round(0.2 * n) # finetuned
     if max_length_tabu is None:
         max_length_tabu = int(math.sqrt(n)) # finetuned
+    neighbors = route_of = position = None
+    if granularity:
+        neighbors = get_neighbors(instance, granularity)
+        route_of, position = build_position_index(current_sol, n)
+    if budget is None:
+        budget = Budget()
 
-    improv = 0 
-    while improv < iterations:
+    # Neighbors are only evaluated, the selected moves are applied in place to current_sol
+    while improv < iterations and not budget.exhausted():
         best_delta = 0
-        best_worse_delta = sum(sum(instance["edge_weight"]))
-        best_solution = current_best_sol.copy()
-        best_worse_neighbor = current_sol.copy() 
+        best_worse_delta = float('inf')
+        best_move = None
+        best_worse_move = None
         to_be_added = None
 
         # Exploration of the neighborhood
         for iter in range(size_neighborhood):
-            route_1_idx = random.randint(0,len(current_sol)-1)
-            route_2_idx = random.randint(0,len(current_sol)-1)
+            name, move, delta, (route_1_idx, route_2_idx) = sample_inter_route_move(current_sol, instance, operators, loads, prefix_loads,
+                                                                                   neighbors, route_of, position)
             # Check if the selected move is in the tabu list
             if [route_1_idx, route_2_idx] not in tabu_list and [route_2_idx, route_1_idx] not in tabu_list:
-                neighbor, delta = exchange_move(current_sol, route_1_idx, route_2_idx, instance)
-                neighbor_length = compute_total_cost(neighbor, instance["edge_weight"])
+                neighbor_length = current_length + delta
 
                 # Check if the new neighbor is a new best solution
                 if neighbor_length >= current_best_length:
-                    # If not we calculate the delta with the current solution
-                    delta = neighbor_length - current_length 
                     # If it is the neighbor with the lowest F(x') [and F(x') < F(x*) previously checked], we select it
                     if delta <= best_worse_delta:
                         best_worse_delta = delta
-                        best_worse_neighbor = neighbor.copy()
+                        best_worse_move = (name, move) if move is not None else None
                         to_be_added = [route_1_idx, route_2_idx]
 
                 # if best solution found, we save it
                 else: 
                     delta_best = neighbor_length - current_best_length
-                    if delta_best < best_delta:
-                        best_solution = neighbor.copy()
+                    if delta_best < best_delta and move is not None:
+                        best_move = (name, move)
                         best_delta = delta_best
                         improv = 0
+
+        # In case we found an improvement x* <- x: materialize it by applying the move,
+        # copying the solution and undoing the move again
+        if best_move is not None:
+            name, move = best_move
+            undo = apply_inter_route_move(current_sol, name, move)
+            current_best_sol = [route.copy() for route in current_sol if route]
+            apply_inter_route_move(current_sol, name, undo)
+            current_best_length += best_delta  # Update F(x*)
+            budget.improved(on_improvement, current_best_length, lambda: [route.copy() for route in current_best_sol if route])
                     
         # Update the tabo list:
         if to_be_added is not None:         
@@ -70,10 +103,19 @@ def tabu_search(instance, routes, max_no_improv = 100, size_neighborhood=None, m
         if len(tabu_list) > max_length_tabu: 
             tabu_list.pop(0)
 
-        current_sol = best_worse_neighbor # Update the current solution x <- x'
-        current_length += best_worse_delta # Update current length F(x) <- F(x')
-        current_best_sol = best_solution # In case we found an improvement x* <- x    
-        current_best_length += best_delta  # Update F(x*)
+        # Update the current solution x <- x'
+        if to_be_added is not None:
+            if best_worse_move is not None:
+                name, move = best_worse_move
+                apply_inter_route_move(current_sol, name, move, instance["demand"], loads, prefix_loads, route_of, position)
+            current_length += best_worse_delta # Update current length F(x) <- F(x')
+        budget.spend(size_neighborhood)
         improv+=1
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save("tabu_search", {"current": current_sol, "best": current_best_sol, "current_length": current_length,
+                                            "best_length": current_best_length, "tabu_list": tabu_list, "improv": improv})
     
-    return current_best_sol
\ No newline at end of file
+    result = [route for route in current_best_sol if route]
+    if checkpoint is not None:
+        checkpoint.save("tabu_search", {"result": result})
+    return result
\ No newline at end of file
@@ -0,0 +1,88 @@
+import random
+from utils.utils import route_prefix_loads
+
+def cross_exchange_move(routes, route_1_idx, route_2_idx, instance, index_1=None, index_2=None, prefix_loads=None, max_length=3):
+    """
+    Evaluates a random CROSS-exchange between two routes of a VRP solution without applying it:
+    two segments of 1 to max_length consecutive customers swap routes, keeping their orientation
+    index_1/index_2 fix the segment starts instead of sampling them (granular neighborhoods)
+    prefix_loads: cached prefix loads (see compute_prefix_loads), gives the segment and route loads in O(1)
+
+    The delta is computed in O(1) from the four edges at the segment ends.
+    Use apply_cross_exchange to perform the move once it is accepted.
+
+    Return:
+        Tuple[int, int, int, int, int, int]: the move (route_1_idx, index_1, length_1, route_2_idx, index_2, length_2),
+                                             None if skipped/infeasible
+        Float: delta cost from the previous to the new solution
+    """
+    if route_1_idx == route_2_idx:
+        return None, 0  # skip intra-route moves
+
+    capacity = instance["capacity"]
+    demands = instance["demand"]
+    edge_weight = instance["edge_weight"]
+
+    route1 = routes[route_1_idx]
+    route2 = routes[route_2_idx]
+
+    if index_1 is None and route1:
+        index_1 = random.randint(0, len(route1) - 1)
+    if index_2 is None and route2:
+        index_2 = random.randint(0, len(route2) - 1)
+    if index_1 is None or index_2 is None or index_1 >= len(route1) or index_2 >= len(route2):
+        return None, 0
+    length_1 = random.randint(1, min(max_length, len(route1) - index_1))
+    length_2 = random.randint(1, min(max_length, len(route2) - index_2))
+
+    if prefix_loads is None:
+        prefix1 = route_prefix_loads(route1, demands)
+        prefix2 = route_prefix_loads(route2, demands)
+    else:
+        prefix1 = prefix_loads[route_1_idx]
+        prefix2 = prefix_loads[route_2_idx]
+    shift = (prefix2[index_2 + length_2] - prefix2[index_2]) - (prefix1[index_1 + length_1] - prefix1[index_1])
+    if prefix1[-1] + shift > capacity or prefix2[-1] - shift > capacity:
+        return None, 0  # infeasible
+
+    # Compute delta cost from the touched edges only
+    first1, last1 = route1[index_1], route1[index_1 + length_1 - 1]
+    first2, last2 = route2[index_2], route2[index_2 + length_2 - 1]
+    prev1 = route1[index_1 - 1] if index_1 > 0 else 0
+    next1 = route1[index_1 + length_1] if index_1 + length_1 < len(route1) else 0
+    prev2 = route2[index_2 - 1] if index_2 > 0 else 0
+    next2 = route2[index_2 + length_2] if index_2 + length_2 < len(route2) else 0
+
+    delta = float(edge_weight[prev1, first2] + edge_weight[last2, next1]
+                  + edge_weight[prev2, first1] + edge_weight[last1, next2]
+                  - edge_weight[prev1, first1] - edge_weight[last1, next1]
+                  - edge_weight[prev2, first2] - edge_weight[last2, next2])
+
+    return (route_1_idx, index_1, length_1, route_2_idx, index_2, length_2), delta
+
+
+def apply_cross_exchange(routes, move, demands=None, loads=None, prefix_loads=None):
+    """
+    Applies a CROSS-exchange in place (and updates the cached loads/prefix loads if given)
+    Swapping the segments back (with the lengths exchanged) is the undo record
+
+    Return:
+        Tuple[int, int, int, int, int, int]: undo record of the move
+    """
+    route_1_idx, index_1, length_1, route_2_idx, index_2, length_2 = move
+    route1 = routes[route_1_idx]
+    route2 = routes[route_2_idx]
+    segment1 = route1[index_1:index_1 + length_1]
+    segment2 = route2[index_2:index_2 + length_2]
+    route1[index_1:index_1 + length_1] = segment2
+    route2[index_2:index_2 + length_2] = segment1
+
+    if loads is not None:
+        shift = sum(demands[cust] for cust in segment2) - sum(demands[cust] for cust in segment1)
+        loads[route_1_idx] += shift
+        loads[route_2_idx] -= shift
+    if prefix_loads is not None:
+        prefix_loads[route_1_idx] = route_prefix_loads(route1, demands)
+        prefix_loads[route_2_idx] = route_prefix_loads(route2, demands)
+
+    return (route_1_idx, index_1, length_2, route_2_idx, index_2, length_1)
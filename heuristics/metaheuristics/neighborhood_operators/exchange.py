@@ -1,17 +1,21 @@
 import random
-import copy
-from utils.utils import compute_route_cost
+from utils.utils import route_prefix_loads
 
-def exchange_move(routes, route_1_idx, route_2_idx, instance):
+def exchange_move(routes, route_1_idx, route_2_idx, instance, index_1=None, index_2=None, loads=None):
     """
-    Swaps the position of two random nodes among two routes of a VRP solution
+    Evaluates the swap of two random nodes among two routes of a VRP solution without applying it
+    index_1/index_2 fix the positions to swap instead of sampling them (granular neighborhoods)
+    loads: cached route loads (see compute_route_loads), avoids re-summing the demands of both routes
+
+    The delta is computed in O(1) from the four edges that change.
+    Use apply_exchange to perform the move once it is accepted.
 
     Return:
-        List[List[int]]: modified VRP solution
+        Tuple[int, int, int, int]: the move (route_1_idx, index_1, route_2_idx, index_2), None if skipped/infeasible
         Float: delta cost from the previous to the new solution
     """
     if route_1_idx == route_2_idx:
-        return routes, 0  # skip intra-route swaps
+        return None, 0  # skip intra-route swaps
 
     capacity = instance["capacity"]
     demands = instance["demand"]
@@ -21,37 +25,63 @@ def exchange_move(routes, route_1_idx, route_2_idx, instance):
     route2 = routes[route_2_idx]
 
     if not route1 or not route2:
-        return routes, 0
+        return None, 0
 
-    index_1 = random.randint(0, len(route1) - 1)
-    index_2 = random.randint(0, len(route2) - 1)
+    if index_1 is None:
+        index_1 = random.randint(0, len(route1) - 1)
+    if index_2 is None:
+        index_2 = random.randint(0, len(route2) - 1)
 
     node1 = route1[index_1]
     node2 = route2[index_2]
 
-    load1 = sum(demands[i] for i in route1) - demands[node1] + demands[node2]
-    load2 = sum(demands[i] for i in route2) - demands[node2] + demands[node1]
+    if loads is None:
+        load1 = sum(demands[i] for i in route1)
+        load2 = sum(demands[i] for i in route2)
+    else:
+        load1 = loads[route_1_idx]
+        load2 = loads[route_2_idx]
+    load1 += demands[node2] - demands[node1]
+    load2 += demands[node1] - demands[node2]
 
     if load1 > capacity or load2 > capacity:
-        return routes, 0  # infeasible
+        return None, 0  # infeasible
+
+    # Compute delta cost from the touched edges only
+    prev1 = route1[index_1 - 1] if index_1 > 0 else 0
+    next1 = route1[index_1 + 1] if index_1 + 1 < len(route1) else 0
+    prev2 = route2[index_2 - 1] if index_2 > 0 else 0
+    next2 = route2[index_2 + 1] if index_2 + 1 < len(route2) else 0
+
+    delta = float(edge_weight[prev1, node2] + edge_weight[node2, next1]
+                  - edge_weight[prev1, node1] - edge_weight[node1, next1]
+                  + edge_weight[prev2, node1] + edge_weight[node1, next2]
+                  - edge_weight[prev2, node2] - edge_weight[node2, next2])
 
-    # Apply swap
-    new_route1 = copy.deepcopy(route1)
-    new_route2 = copy.deepcopy(route2)
-    new_route1[index_1] = node2
-    new_route2[index_2] = node1
+    return (route_1_idx, index_1, route_2_idx, index_2), delta
 
-    # Compute delta cost
-    old_cost_1 = compute_route_cost(route1, edge_weight)
-    old_cost_2 = compute_route_cost(route2, edge_weight)
-    new_cost_1 = compute_route_cost(new_route1, edge_weight)
-    new_cost_2 = compute_route_cost(new_route2, edge_weight)
 
-    delta = (new_cost_1 + new_cost_2) - (old_cost_1 + old_cost_2)
+def apply_exchange(routes, move, demands=None, loads=None, prefix_loads=None):
+    """
+    Applies an exchange move in place (and updates the cached loads/prefix loads if given)
+    A swap is its own inverse: applying the returned undo record again restores the solution
+
+    Return:
+        Tuple[int, int, int, int]: undo record of the move
+    """
+    route_1_idx, index_1, route_2_idx, index_2 = move
+    route1 = routes[route_1_idx]
+    route2 = routes[route_2_idx]
+    node1 = route1[index_1]
+    node2 = route2[index_2]
+    route1[index_1] = node2
+    route2[index_2] = node1
 
-    # Build new routes list
-    new_routes = copy.deepcopy(routes)
-    new_routes[route_1_idx] = new_route1
-    new_routes[route_2_idx] = new_route2
+    if loads is not None:
+        loads[route_1_idx] += demands[node2] - demands[node1]
+        loads[route_2_idx] += demands[node1] - demands[node2]
+    if prefix_loads is not None:
+        prefix_loads[route_1_idx] = route_prefix_loads(route1, demands)
+        prefix_loads[route_2_idx] = route_prefix_loads(route2, demands)
 
-    return new_routes, delta
\ No newline at end of file
+    return move
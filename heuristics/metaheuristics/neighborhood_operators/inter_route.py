@@ -0,0 +1,68 @@
+import random
+from heuristics.metaheuristics.neighborhood_operators.exchange import exchange_move, apply_exchange
+from heuristics.metaheuristics.neighborhood_operators.relocate import relocate_move, apply_relocate
+from heuristics.metaheuristics.neighborhood_operators.two_opt_star import two_opt_star_move, apply_two_opt_star
+from heuristics.metaheuristics.neighborhood_operators.cross_exchange import cross_exchange_move, apply_cross_exchange
+from utils.neighbors import reindex_places, reindex_routes, sample_granular_exchange, sample_granular_place
+
+# Inter-route operators sampled by tabu_search and simulated_annealing
+INTER_ROUTE_OPERATORS = ("exchange", "relocate", "two_opt_star", "cross_exchange")
+
+_APPLY = {
+    "exchange": apply_exchange,
+    "relocate": apply_relocate,
+    "two_opt_star": apply_two_opt_star,
+    "cross_exchange": apply_cross_exchange,
+}
+
+
+def sample_inter_route_move(routes, instance, operators, loads, prefix_loads, neighbors=None, route_of=None, position=None):
+    """
+    Samples one of the operators and evaluates a random move of it between two routes without applying it
+    neighbors/route_of/position: if given, the move is restricted to the neighbor lists (granular neighborhoods)
+
+    Return:
+        str: name of the sampled operator
+        Tuple: the move, None if skipped/infeasible
+        Float: delta cost from the previous to the new solution
+        Tuple[int, int]: indices of the two routes involved
+    """
+    name = random.choice(operators)
+    if neighbors is not None:
+        if name == "exchange":
+            route_1_idx, index_1, route_2_idx, index_2 = sample_granular_exchange(routes, route_of, position, neighbors)
+        else:
+            route_1_idx, index_1, route_2_idx, index_2 = sample_granular_place(route_of, position, neighbors)
+    else:
+        route_1_idx = random.randint(0, len(routes) - 1)
+        route_2_idx = random.randint(0, len(routes) - 1)
+        index_1 = index_2 = None
+
+    if name == "exchange":
+        move, delta = exchange_move(routes, route_1_idx, route_2_idx, instance, index_1, index_2, loads)
+    elif name == "relocate":
+        move, delta = relocate_move(routes, route_1_idx, route_2_idx, instance, index_1, index_2, prefix_loads)
+    elif name == "two_opt_star":
+        move, delta = two_opt_star_move(routes, route_1_idx, route_2_idx, instance, index_1, index_2, prefix_loads)
+    else:
+        move, delta = cross_exchange_move(routes, route_1_idx, route_2_idx, instance, index_1, index_2, prefix_loads)
+    return name, move, delta, (route_1_idx, route_2_idx)
+
+
+def apply_inter_route_move(routes, name, move, demands=None, loads=None, prefix_loads=None, route_of=None, position=None):
+    """
+    Applies a move sampled by sample_inter_route_move in place, updates the cached loads/prefix loads
+    and the position index (route_of/position) if given
+
+    Return:
+        Tuple: undo record of the move (apply it with the same operator name)
+    """
+    undo = _APPLY[name](routes, move, demands, loads, prefix_loads)
+    if route_of is not None:
+        if name == "exchange":
+            reindex_places(routes, [move[:2], move[2:]], route_of, position)
+        else:
+            # (route_1_idx, index_1, route_2_idx, index_2) or (route_1_idx, index_1, length, route_2_idx, ...)
+            route_2_idx = move[2] if len(move) == 4 else move[3]
+            reindex_routes(routes, (move[0], route_2_idx), route_of, position)
+    return undo
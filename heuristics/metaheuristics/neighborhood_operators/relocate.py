@@ -0,0 +1,86 @@
+import random
+from utils.utils import route_prefix_loads
+
+def relocate_move(routes, route_1_idx, route_2_idx, instance, index_1=None, index_2=None, prefix_loads=None, length=None):
+    """
+    Evaluates moving a segment of 1 or 2 consecutive customers (relocate 1-0 / 2-0) of route 1
+    in front of position index_2 of route 2 without applying it
+    index_1/index_2 fix the segment start and the insertion place instead of sampling them (granular neighborhoods)
+    prefix_loads: cached prefix loads (see compute_prefix_loads), gives the segment and route loads in O(1)
+    length: segment length, sampled from {1, 2} if not given
+
+    The delta is computed in O(1) from the three removed and three added edges.
+    Use apply_relocate to perform the move once it is accepted.
+
+    Return:
+        Tuple[int, int, int, int, int]: the move (route_1_idx, index_1, length, route_2_idx, index_2), None if skipped/infeasible
+        Float: delta cost from the previous to the new solution
+    """
+    if route_1_idx == route_2_idx:
+        return None, 0  # skip intra-route moves
+
+    capacity = instance["capacity"]
+    demands = instance["demand"]
+    edge_weight = instance["edge_weight"]
+
+    route1 = routes[route_1_idx]
+    route2 = routes[route_2_idx]
+
+    if length is None:
+        length = random.randint(1, 2)
+    if len(route1) < length:
+        return None, 0
+    if index_1 is None:
+        index_1 = random.randint(0, len(route1) - length)
+    if index_2 is None:
+        index_2 = random.randint(0, len(route2))
+    if index_1 + length > len(route1) or index_2 > len(route2):
+        return None, 0
+
+    if prefix_loads is None:
+        prefix1 = route_prefix_loads(route1, demands)
+        prefix2 = route_prefix_loads(route2, demands)
+    else:
+        prefix1 = prefix_loads[route_1_idx]
+        prefix2 = prefix_loads[route_2_idx]
+    if prefix2[-1] + prefix1[index_1 + length] - prefix1[index_1] > capacity:
+        return None, 0  # infeasible
+
+    # Compute delta cost from the touched edges only
+    first = route1[index_1]
+    last = route1[index_1 + length - 1]
+    prev1 = route1[index_1 - 1] if index_1 > 0 else 0
+    next1 = route1[index_1 + length] if index_1 + length < len(route1) else 0
+    prev2 = route2[index_2 - 1] if index_2 > 0 else 0
+    next2 = route2[index_2] if index_2 < len(route2) else 0
+
+    delta = float(edge_weight[prev1, next1] - edge_weight[prev1, first] - edge_weight[last, next1]
+                  + edge_weight[prev2, first] + edge_weight[last, next2] - edge_weight[prev2, next2])
+
+    return (route_1_idx, index_1, length, route_2_idx, index_2), delta
+
+
+def apply_relocate(routes, move, demands=None, loads=None, prefix_loads=None):
+    """
+    Applies a relocate move in place (and updates the cached loads/prefix loads if given)
+    The segment ends up at route_2[index_2:index_2 + length], relocating it back is the undo record
+
+    Return:
+        Tuple[int, int, int, int, int]: undo record of the move
+    """
+    route_1_idx, index_1, length, route_2_idx, index_2 = move
+    route1 = routes[route_1_idx]
+    route2 = routes[route_2_idx]
+    segment = route1[index_1:index_1 + length]
+    del route1[index_1:index_1 + length]
+    route2[index_2:index_2] = segment
+
+    if loads is not None:
+        segment_load = sum(demands[cust] for cust in segment)
+        loads[route_1_idx] -= segment_load
+        loads[route_2_idx] += segment_load
+    if prefix_loads is not None:
+        prefix_loads[route_1_idx] = route_prefix_loads(route1, demands)
+        prefix_loads[route_2_idx] = route_prefix_loads(route2, demands)
+
+    return (route_2_idx, index_2, length, route_1_idx, index_1)
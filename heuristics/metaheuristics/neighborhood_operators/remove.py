@@ -1,14 +1,27 @@
 import random
-from utils.utils import compute_total_cost
+import numpy as np
+from utils.solution import Solution
 
 def random_removal(solution, num_remove):
     """
     Randomly selects and removes #num_remove nodes from a VRP solution
+    A Solution object is destroyed in place (only the touched routes are updated),
+    a List[List[int]] solution is left untouched
 
     Return:
-    List[List[int]]: destroyed VRP solution
+    List[List[int]] or Solution: destroyed VRP solution
     List[int]: removed nodes
     """
+    if isinstance(solution, Solution):
+        visited_customers = solution.customers().tolist()
+        assert num_remove <= len(visited_customers), \
+            f"Cannot remove {num_remove} from only {len(visited_customers)} customers"
+        removed_customers = random.sample(visited_customers, num_remove)
+        for cust in removed_customers:
+            solution.remove(cust)
+        solution.compact()
+        return solution, removed_customers
+
     # Create a set of all unique visited customers
     visited_customers = sorted(set(cust for route in solution for cust in route))
 
@@ -35,49 +48,48 @@ def random_removal(solution, num_remove):
     return partial_solution, removed_customers
 
 
-def worst_removal(instance, solution, num_remove):
+def worst_removal(instance, solution, num_remove, p=None):
     """
     Selects the #num_remove worst (most expensive) nodes and removes them from a route
 
+    The removal gain d(pred, c) + d(c, succ) - d(pred, succ) of every customer is
+    computed in one vectorized pass. With p set, customers are drawn by randomized
+    rank instead (index floor(y^p * #remaining) of the sorted list, y ~ U(0, 1)),
+    larger p makes the choice closer to the deterministic one
+
+    A Solution object is destroyed in place, a List[List[int]] solution is copied first
+
     Return:
-    List[List[int]]: destroyed VRP solution
+    List[List[int]] or Solution: destroyed VRP solution (same type as the input)
     List[int]: removed nodes
     """
-    # Save all customers in a flat list
-    flat_customers = [cust for route in solution for cust in route]
-
-    # Calculate the increase in cost for each customer removal
-    customer_cost_impact = {}
-
-    for cust in flat_customers:
-        # Try removing the customer and compute the cost change
-        partial_solution = []
-        for route in solution:
-            new_route = [c for c in route if c != cust]
-            if new_route:  # Only add non-empty routes
-                partial_solution.append(new_route)
-
-        # Compute the cost of the modified solution
-        new_cost = compute_total_cost(partial_solution, instance["edge_weight"])
-        old_cost = compute_total_cost(solution, instance["edge_weight"])
-        cost_increase = new_cost - old_cost
-        customer_cost_impact[cust] = cost_increase
-
-    # Sort customers by the largest cost increase (worst removal first)
-    worst_customers = sorted(customer_cost_impact, key=customer_cost_impact.get, reverse=True)
-
-    # Select the top `num_remove` worst customers
-    to_remove = set(worst_customers[:num_remove])
-
-    # Rebuild the solution after removing the worst customers
-    partial_solution = []
-    removed_customers = []
-
-    for route in solution:
-        new_route = [cust for cust in route if cust not in to_remove]
-        removed = [cust for cust in route if cust in to_remove]
-        if new_route:
-            partial_solution.append(new_route)
-        removed_customers.extend(removed)
-
-    return partial_solution, removed_customers
+    as_routes = not isinstance(solution, Solution)
+    if as_routes:
+        solution = Solution.from_routes(solution, instance)
+
+    customers = solution.customers()
+    assert num_remove <= len(customers), \
+        f"Cannot remove {num_remove} from only {len(customers)} customers"
+
+    # removal gain of every customer from its predecessor and successor
+    edge_weight = instance["edge_weight"]
+    pred = solution.pred[customers]
+    succ = solution.succ[customers]
+    gains = edge_weight[pred, customers] + edge_weight[customers, succ] - edge_weight[pred, succ]
+
+    # Sort customers by the largest gain (worst removal first)
+    worst_customers = customers[np.argsort(-gains, kind="stable")].tolist()
+
+    if p is None:
+        removed_customers = worst_customers[:num_remove]
+    else:
+        removed_customers = []
+        for _ in range(num_remove):
+            idx = int(random.random() ** p * len(worst_customers))
+            removed_customers.append(worst_customers.pop(idx))
+
+    for cust in removed_customers:
+        solution.remove(cust)
+    solution.compact()
+
+    return (solution.to_routes() if as_routes else solution), removed_customers
@@ -1,55 +1,108 @@
-import copy
-from utils.utils import is_feasible, compute_total_cost
-import random
+import heapq
+import numpy as np
+from utils.neighbors import get_neighbors, NEIGHBOR_LIST_SIZE
+from utils.solution import Solution
+
+def best_insertion(solution, cust, candidate_routes):
+    """
+    Finds the cheapest feasible insertion of a customer into the candidate routes
+    of a Solution (O(1) capacity check per route, all positions of a route are scored at once)
+
+    Return:
+        Float: insertion cost (inf if there is no feasible position)
+        Int: route index (None if there is no feasible position)
+        Int: position in the route (None if there is no feasible position)
+    """
+    best_cost = float('inf')
+    best_position = None
+    best_route_idx = None
+
+    for r_idx in candidate_routes:
+        if not solution.fits(cust, r_idx):
+            continue
+        delta_cost = solution.route_insertion_costs([cust], r_idx)[0]
+
+        i = int(np.argmin(delta_cost))
+        if delta_cost[i] < best_cost:
+            best_cost = float(delta_cost[i])
+            best_position = i
+            best_route_idx = r_idx
+
+    return best_cost, best_route_idx, best_position
+
+def neighbor_insertion(solution, cust, neighbors):
+    """
+    Finds the cheapest feasible insertion of a customer right before or right after
+    one of its routed neighbors (all candidate positions are scored at once)
+
+    Return:
+        Float: insertion cost (inf if there is no feasible position)
+        Int: route index (None if there is no feasible position)
+        Int: position in the route (None if there is no feasible position)
+    """
+    nodes = neighbors[cust]
+    route_idx = solution.route_of[nodes]
+    feasible = [r_idx >= 0 and solution.fits(cust, r_idx) for r_idx in route_idx.tolist()]
+    nodes = nodes[feasible]
+    if not len(nodes):
+        return float('inf'), None, None
+    route_idx = route_idx[feasible]
+
+    edge_weight = solution.edge_weight
+    pred = solution.pred[nodes]
+    succ = solution.succ[nodes]
+    to_cust = edge_weight[cust, nodes]
+    delta_cost = np.concatenate((
+        edge_weight[cust, pred] + to_cust - edge_weight[pred, nodes],  # pred -> cust -> node
+        to_cust + edge_weight[cust, succ] - edge_weight[nodes, succ],  # node -> cust -> succ
+    ))
+    positions = solution.position[nodes]
+
+    i = int(np.argmin(delta_cost))
+    j = i % len(nodes)
+    return float(delta_cost[i]), int(route_idx[j]), int(positions[j]) + (i >= len(nodes))
 
 # greedy repair is the cheapest feasible insertion
-def greedy_repair(instance, solution, removed_customers):
+def greedy_repair(instance, solution, removed_customers, granularity=NEIGHBOR_LIST_SIZE):
     """
     Performs greedy insertion to repair a VRP solution
 
+    A customer is inserted at the cheapest position next to one of its granularity-nearest
+    routed neighbors. If none of them has a feasible position (or granularity is None),
+    all routes with residual capacity are scanned, and a new route is opened as a last resort
+
+    A Solution object is repaired in place, a List[List[int]] solution is copied first
+
     Return:
-    List[List[int]]: repaired VRP solution
+    List[List[int]] or Solution: repaired VRP solution (same type as the input)
     """
-    solution = copy.deepcopy(solution)
+    as_routes = not isinstance(solution, Solution)
+    if as_routes:
+        solution = Solution.from_routes(solution, instance)
     inserted_customers = set()
 
+    if granularity:
+        neighbors = get_neighbors(instance, granularity)
+
     for cust in removed_customers:
-        best_cost = float('inf')
         best_position = None
-        best_route_idx = None
-
-        # this helps go go from O(n**2) to O(n) -- tradeoff: performance (-) for runtime (-)
-        sampled_routes = random.sample(solution, min(len(solution), 25))  # sample 25 routes
-
-        for route in sampled_routes:
-            r_idx = solution.index(route)
-            for i in range(len(route) + 1):
-                prev = route[i - 1] if i > 0 else 0
-                next = route[i] if i < len(route) else 0
-
-                delta_cost = (
-                    instance["edge_weight"][prev][cust] +
-                    instance["edge_weight"][cust][next] -
-                    instance["edge_weight"][prev][next]
-                )
-
-                if delta_cost < best_cost:
-                    new_route = route[:i] + [cust] + route[i:]
-                    if is_feasible(new_route, instance):
-                        best_cost = delta_cost
-                        best_position = i
-                        best_route_idx = r_idx
+
+        if granularity:
+            _, best_route_idx, best_position = neighbor_insertion(solution, cust, neighbors)
+
+        if best_position is None:
+            # exhaustive fallback, best_insertion skips the routes without residual capacity
+            _, best_route_idx, best_position = best_insertion(solution, cust, range(len(solution)))
 
         if best_position is not None:
-            solution[best_route_idx].insert(best_position, cust)
-            inserted_customers.add(cust)
+            solution.insert(cust, best_route_idx, best_position)
         else:
-            solution.append([cust])
-            inserted_customers.add(cust)
+            solution.add_route([cust])
+        inserted_customers.add(cust)
 
     # Final integrity check with detailed output
     all_customers = set(range(1, instance["dimension"]))
-    visited = set(c for route in solution for c in route)
+    visited = set(solution.customers().tolist())
 
     missing = all_customers - visited
     extra   = visited - all_customers
@@ -64,49 +117,107 @@ def greedy_repair(instance, solution, removed_customers):
             print("Unexpected extra customers:", extra)
         raise RuntimeError("[greedy_repair] Final customer mismatch after repair")
 
-    return solution
+    return solution.to_routes() if as_routes else solution
 
 def regret_repair(instance, solution, removed_customers, k=3):
     """
     Performs regret K insertion to repair a VRP solution
 
+    Every removed customer keeps its cheapest feasible insertion per route (one row of a
+    customers x routes matrix) and the routes of its k best insertions, the regrets are
+    kept in a global heap. After an insertion only the column of the changed route is
+    re-evaluated, for all pending customers in one vectorized pass (O(1) capacity check,
+    O(1) delta per position), and only the customers whose k best insertions change
+    (the route was among them, or now beats the k-th) re-rank their row and push a new regret.
+    Regrets of an older stamp of a customer are dropped when they reach the top of the heap.
+
+    A Solution object is repaired in place, a List[List[int]] solution is copied first
+
     Return:
-    List[List[int]]: repaired VRP solution
+    List[List[int]] or Solution: repaired VRP solution (same type as the input)
     """
-    while removed_customers:
-        solution = copy.deepcopy(solution)
-        regret_list = []
-
-        for cust in removed_customers:
-            insertions = []
-            for r_idx, route in enumerate(solution):
-                for i in range(len(route) + 1):
-                    new_route = route[:i] + [cust] + route[i:]
-                    if is_feasible(new_route, instance):
-                        cost = compute_total_cost([new_route], instance["edge_weight"])
-                        insertions.append((cost, r_idx, i))
-            
-            if insertions:
-                insertions.sort()
-                if len(insertions) >= k:
-                    regret = insertions[k-1][0] - insertions[0][0]
-                else:
-                    regret = insertions[-1][0] - insertions[0][0]
-
-                best_cost, best_r_idx, best_pos = insertions[0]
-                regret_list.append((regret, best_cost, cust, best_r_idx, best_pos))
+    as_routes = not isinstance(solution, Solution)
+    if as_routes:
+        solution = Solution.from_routes(solution, instance)
+    customers = np.asarray(removed_customers, dtype=np.int64)
+    pending = np.ones(len(customers), dtype=bool)
+
+    demands = instance["demand"]
+    capacity = instance["capacity"]
+
+    # cheapest insertion delta (inf if the route is full) and position of every customer into every route
+    costs = np.full((len(customers), len(solution)), np.inf)
+    positions = np.zeros((len(customers), len(solution)), dtype=np.int64)
+    # routes of the k cheapest insertions of every customer (sorted, -1 = none) and the k-th delta
+    top_routes = np.full((len(customers), k), -1, dtype=np.int64)
+    kth_cost = np.full(len(customers), np.inf)
+    # regret heap (-regret, -cheapest delta, -cust, row, stamp), only the last stamp of a pending row counts
+    regrets = []
+    stamp = [0] * len(customers)
+
+    def update_route(rows, r_idx):
+        # O(1) capacity check and all insertion deltas of the route for all customers at once
+        fits = solution.loads[r_idx] + demands[customers[rows]] <= capacity
+        delta_cost = solution.route_insertion_costs(customers[rows], r_idx)
+        pos = np.argmin(delta_cost, axis=1)
+        costs[rows, r_idx] = np.where(fits, delta_cost[np.arange(len(rows)), pos], np.inf)
+        positions[rows, r_idx] = pos
+
+    def update_best_k(rows):
+        # routes sorted by (delta, r_idx) like (delta, r_idx, pos) tuples, for all rows at once
+        row_costs = costs[rows]
+        order = np.argsort(row_costs, axis=1, kind="stable")[:, :k]
+        top = np.full((len(rows), k), np.inf)
+        top[:, :order.shape[1]] = np.take_along_axis(row_costs, order, axis=1)
+        routes = np.full((len(rows), k), -1, dtype=np.int64)
+        routes[:, :order.shape[1]] = order
+        feasible = np.isfinite(top)
+        n_feasible = feasible.sum(axis=1)
+        top_routes[rows] = np.where(feasible, routes, -1)
+        kth_cost[rows] = top[:, -1]
+        # regret = k-th best - best delta (of the available ones)
+        first = top[:, 0]
+        last = top[np.arange(len(rows)), np.maximum(n_feasible - 1, 0)]
+
+        for row, cust, n, best, worst in zip(rows.tolist(), customers[rows].tolist(), n_feasible.tolist(),
+                                             first.tolist(), last.tolist()):
+            stamp[row] += 1
+            if n:
+                key = (best - worst, -best)
             else:
                 # No feasible insertions for now → will be appended to new route
-                regret_list.append((-1, float('inf'), cust, None, None))
+                key = (1, -float('inf'))
+            heapq.heappush(regrets, key + (-cust, row, stamp[row]))
 
-        # Choose customer with highest regret
-        regret_list.sort(reverse=True)
-        _, _, chosen_cust, r_idx, pos = regret_list[0]
-        removed_customers.remove(chosen_cust)
+    rows = np.arange(len(customers))
+    if len(rows):
+        for r_idx in range(len(solution)):
+            update_route(rows, r_idx)
+    update_best_k(rows)
 
-        if r_idx is not None:
-            solution[r_idx].insert(pos, chosen_cust)
+    for _ in range(len(customers)):
+        # Choose customer with highest regret
+        while True:
+            *_, chosen_row, chosen_stamp = heapq.heappop(regrets)
+            if pending[chosen_row] and stamp[chosen_row] == chosen_stamp:
+                break
+        pending[chosen_row] = False
+        chosen_cust = int(customers[chosen_row])
+        r_idx = int(top_routes[chosen_row, 0])
+
+        if r_idx >= 0:
+            solution.insert(chosen_cust, r_idx, int(positions[chosen_row, r_idx]))
         else:
-            solution.append([chosen_cust])
-
-    return solution
\ No newline at end of file
+            r_idx = solution.add_route([chosen_cust])
+            costs = np.hstack((costs, np.full((len(customers), 1), np.inf)))
+            positions = np.hstack((positions, np.zeros((len(customers), 1), dtype=np.int64)))
+
+        # only the changed route has to be re-evaluated
+        rows = np.flatnonzero(pending)
+        if not len(rows):
+            break
+        update_route(rows, r_idx)
+        changed = (top_routes[rows] == r_idx).any(axis=1) | (costs[rows, r_idx] <= kth_cost[rows])
+        update_best_k(rows[changed])
+
+    return solution.to_routes() if as_routes else solution
@@ -1,18 +1,19 @@
-import copy
 import numpy as np
-from utils.utils import compute_route_cost
-import random
 
 def two_opt_move(routes, route_idx, edge_weight):
     """
-    Performs intra-route two-opt to a route of a VRP solution
+    Evaluates a random intra-route two-opt on a route of a VRP solution without applying it
+
+    Reversing route[i:j] only replaces the edges entering and leaving the segment,
+    so the delta is computed in O(1) (symmetric distances).
+    Use apply_two_opt to perform the move once it is accepted.
 
     Return:
-        List[List[int]]: modified VRP solution
+        Tuple[int, int, int]: the move (route_idx, i, j), None if the route is too short
         Float: delta cost from the previous to the new solution
     """
     if not routes or len(routes[route_idx]) < 4:
-        return routes, 0  # too short to optimize
+        return None, 0  # too short to optimize
 
     route = routes[route_idx]
     n = len(route)
@@ -21,14 +22,24 @@ def two_opt_move(routes, route_idx, edge_weight):
     i = np.random.randint(0, n - 2)
     j = np.random.randint(i + 2, n)
 
-    new_route = route[:i] + list(reversed(route[i:j])) + route[j:]
-    
-    # Compute cost delta for this route only
-    old_cost = compute_route_cost(route, edge_weight)
-    new_cost = compute_route_cost(new_route, edge_weight)
-    delta = new_cost - old_cost
+    # Compute cost delta from the two replaced edges
+    before = route[i - 1] if i > 0 else 0
+    after = route[j] if j < n else 0
+    delta = float(edge_weight[before, route[j - 1]] + edge_weight[route[i], after]
+                  - edge_weight[before, route[i]] - edge_weight[route[j - 1], after])
+
+    return (route_idx, i, j), delta
 
-    new_routes = copy.deepcopy(routes)
-    new_routes[route_idx] = new_route
 
-    return new_routes, delta
\ No newline at end of file
+def apply_two_opt(routes, move):
+    """
+    Applies a two-opt move in place by reversing the segment route[i:j]
+    A reversal is its own inverse: applying the returned undo record again restores the solution
+
+    Return:
+        Tuple[int, int, int]: undo record of the move
+    """
+    route_idx, i, j = move
+    route = routes[route_idx]
+    route[i:j] = route[i:j][::-1]
+    return move
@@ -0,0 +1,83 @@
+import random
+from utils.utils import route_prefix_loads
+
+def two_opt_star_move(routes, route_1_idx, route_2_idx, instance, index_1=None, index_2=None, prefix_loads=None):
+    """
+    Evaluates a random 2-opt* move (tail exchange) between two routes of a VRP solution without applying it:
+    route_1[:index_1] + route_2[index_2:] and route_2[:index_2] + route_1[index_1:]
+    index_1/index_2 fix the cut positions instead of sampling them (granular neighborhoods)
+    prefix_loads: cached prefix loads (see compute_prefix_loads), gives the head and tail loads in O(1)
+
+    The delta is computed in O(1) from the two edges that change.
+    Use apply_two_opt_star to perform the move once it is accepted.
+
+    Return:
+        Tuple[int, int, int, int]: the move (route_1_idx, index_1, route_2_idx, index_2), None if skipped/infeasible
+        Float: delta cost from the previous to the new solution
+    """
+    if route_1_idx == route_2_idx:
+        return None, 0  # skip intra-route moves
+
+    capacity = instance["capacity"]
+    demands = instance["demand"]
+    edge_weight = instance["edge_weight"]
+
+    route1 = routes[route_1_idx]
+    route2 = routes[route_2_idx]
+
+    if index_1 is None:
+        index_1 = random.randint(0, len(route1))
+    if index_2 is None:
+        index_2 = random.randint(0, len(route2))
+    if index_1 > len(route1) or index_2 > len(route2):
+        return None, 0
+    if (index_1 == 0 and index_2 == 0) or (index_1 == len(route1) and index_2 == len(route2)):
+        return None, 0  # the two routes would only trade places
+
+    if prefix_loads is None:
+        prefix1 = route_prefix_loads(route1, demands)
+        prefix2 = route_prefix_loads(route2, demands)
+    else:
+        prefix1 = prefix_loads[route_1_idx]
+        prefix2 = prefix_loads[route_2_idx]
+    if (prefix1[index_1] + prefix2[-1] - prefix2[index_2] > capacity
+            or prefix2[index_2] + prefix1[-1] - prefix1[index_1] > capacity):
+        return None, 0  # infeasible
+
+    # Compute delta cost from the two reconnected edges
+    prev1 = route1[index_1 - 1] if index_1 > 0 else 0
+    next1 = route1[index_1] if index_1 < len(route1) else 0
+    prev2 = route2[index_2 - 1] if index_2 > 0 else 0
+    next2 = route2[index_2] if index_2 < len(route2) else 0
+
+    delta = float(edge_weight[prev1, next2] + edge_weight[prev2, next1]
+                  - edge_weight[prev1, next1] - edge_weight[prev2, next2])
+
+    return (route_1_idx, index_1, route_2_idx, index_2), delta
+
+
+def apply_two_opt_star(routes, move, demands=None, loads=None, prefix_loads=None):
+    """
+    Applies a 2-opt* move in place (and updates the cached loads/prefix loads if given)
+    A tail exchange is its own inverse: applying the returned undo record again restores the solution
+
+    Return:
+        Tuple[int, int, int, int]: undo record of the move
+    """
+    route_1_idx, index_1, route_2_idx, index_2 = move
+    route1 = routes[route_1_idx]
+    route2 = routes[route_2_idx]
+    tail1 = route1[index_1:]
+    tail2 = route2[index_2:]
+    route1[index_1:] = tail2
+    route2[index_2:] = tail1
+
+    if loads is not None:
+        shift = sum(demands[cust] for cust in tail2) - sum(demands[cust] for cust in tail1)
+        loads[route_1_idx] += shift
+        loads[route_2_idx] -= shift
+    if prefix_loads is not None:
+        prefix_loads[route_1_idx] = route_prefix_loads(route1, demands)
+        prefix_loads[route_2_idx] = route_prefix_loads(route2, demands)
+
+    return move
@@ -16,6 +16,7 @@ from heuristics.metaheuristics.diversifying_components.genetic_algorithm import
 from heuristics.metaheuristics.diversifying_components.hybrid_genetic_search import HGS
 from heuristics.metaheuristics.diversifying_components.lns import fast_lns, smart_lns
 from utils.tsp_solvers_for_GA import tsp_solver_nn
+from utils.anytime import print_convergence
 
 def run_tabu_experiment(args):
     """
@@ -104,20 +105,21 @@ def main():
 
     # Iterated Local Search - Using Hybrid LS by default
     start = time.time()
-    ils_routes = iterated_local_search(instance, copy.deepcopy(savings_routes), ls=hybrid_ls, it=50, destroy_factor=0.1)
+    ils_routes = iterated_local_search(instance, copy.deepcopy(savings_routes), ls=hybrid_ls, it=50, destroy_factor=0.1,
+                                       on_improvement=print_convergence("Iterated LS"))
     elapsed = round((time.time() - start) / 60, 4)
     log_results("Iterated LS", ils_routes, instance, history, runtime=elapsed, bks=bks)
 
     """
     # Standalone Simulated Annealing
     start = time.time()
-    sa_routes = simulated_annealing(instance, copy.deepcopy(random_routes))
+    sa_routes = simulated_annealing(instance, copy.deepcopy(random_routes), on_improvement=print_convergence("Standalone SA"))
     elapsed = round((time.time() - start) / 60, 4)
     log_results("Standalone SA", sa_routes, instance, history, runtime=elapsed, bks=bks)
 
     # LS + Simulated Annealing
     start = time.time()
-    ls_sa_routes = simulated_annealing(instance, ls_pipeline_routes)
+    ls_sa_routes = simulated_annealing(instance, ls_pipeline_routes, on_improvement=print_convergence("LS + SA"))
     elapsed = round((time.time() - start) / 60, 4)
     log_results("LS + SA", ls_sa_routes, instance, history, runtime=elapsed, bks=bks)
 
@@ -136,13 +138,13 @@ def main():
     """
     # Tabu Search
     start = time.time()
-    tabu_routes = tabu_search(instance, copy.deepcopy(random_routes), 50)
+    tabu_routes = tabu_search(instance, copy.deepcopy(random_routes), 50, on_improvement=print_convergence("Tabu Search"))
     elapsed = round((time.time() - start) / 60, 4)
     log_results("Standalone Tabu Search", tabu_routes, instance, history, runtime=elapsed, bks=bks)
     
     # Fast LNS
     start = time.time()
-    fast_lns_routes = fast_lns(instance, copy.deepcopy(random_routes), 100)
+    fast_lns_routes = fast_lns(instance, copy.deepcopy(random_routes), 100, on_improvement=print_convergence("Fast LNS"))
     elapsed = round((time.time() - start) / 60, 4)
     log_results("Fast LNS", fast_lns_routes, instance, history, runtime=elapsed, bks=bks)
 
@@ -166,7 +168,7 @@ def main():
 
     # Genetic Algorithm
     start = time.time()
-    routes_ga = genetic_algorithm(instance, pop_size = 40)
+    routes_ga = genetic_algorithm(instance, pop_size = 40, on_improvement=print_convergence("Genetic Algorithm"))
     elapsed = round((time.time() - start) / 60, 4)
     log_results("Genetic Algorithm", routes_ga, instance, history, runtime=elapsed, bks=bks)
     """
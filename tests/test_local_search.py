@@ -0,0 +1,18 @@
+import random
+import numpy as np
+import pytest
+from utils.utils import load_instance, compute_total_cost
+from heuristics.construction.random import random_solution
+from heuristics.improvement.local_search import local_search
+
+
+@pytest.mark.parametrize("strategy", ["first", "best"])
+def test_local_search_ends_in_local_optimum(strategy):
+    instance = load_instance("X-n101-k25.vrp", cache=False)
+    for seed in range(10):
+        random.seed(seed)
+        np.random.seed(seed)
+        routes = local_search(instance, random_solution(instance), strategy=strategy)
+        cost = compute_total_cost(routes, instance["edge_weight"])
+        again = local_search(instance, routes, strategy=strategy)
+        assert compute_total_cost(again, instance["edge_weight"]) >= cost - 1e-6
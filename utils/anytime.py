@@ -0,0 +1,66 @@
+import queue
+import threading
+from utils.budget import Budget
+from utils.utils import compute_total_cost
+
+
+def print_convergence(label, interval=0.1):
+    """
+    on_improvement callback printing the new best costs of a solver (at most one line per interval seconds,
+    the solution itself is never copied)
+
+    Return:
+        Callable: callback for the on_improvement parameter of the solvers
+    """
+    last = [-float('inf')]
+
+    def on_improvement(elapsed, cost, routes):
+        if elapsed - last[0] >= interval:
+            last[0] = elapsed
+            print(f"{label:<25} | {elapsed:8.2f}s | {cost:.2f}")
+
+    return on_improvement
+
+
+def anytime(solver, instance, *args, budget=None, **kwargs):
+    """
+    Generator mode of a solver: runs solver(instance, *args, budget=budget, on_improvement=..., **kwargs)
+    in a background thread and yields (elapsed, cost, routes) for every new best solution, and last
+    the solution it returns. The routes are copied when found, as the solver keeps changing its solution.
+    Leaving the loop early stops the solver through its budget:
+
+        for elapsed, cost, routes in anytime(fast_lns, instance, routes, min_iter=math.inf):
+            if cost <= good_enough:
+                break
+
+    Return:
+        Iterator[Tuple[float, float, List[List[int]]]]: improving solutions
+    """
+    if budget is None:
+        budget = Budget()
+    found = queue.Queue()
+
+    def on_improvement(elapsed, cost, routes):
+        found.put(("best", (elapsed, cost, routes())))
+
+    def run():
+        try:
+            found.put(("result", solver(instance, *args, budget=budget, on_improvement=on_improvement, **kwargs)))
+        except BaseException as exc:
+            found.put(("error", exc))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, item = found.get()
+            if kind == "error":
+                raise item
+            if kind == "result":
+                if item is not None:
+                    yield budget.elapsed(), compute_total_cost(item, instance["edge_weight"]), item
+                return
+            yield item
+    finally:
+        budget.stop()
+        thread.join()
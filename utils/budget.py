@@ -0,0 +1,63 @@
+import time
+
+
+class Budget:
+    """
+    Stopping criterion shared by all metaheuristics: a wall-clock time_limit in seconds and/or
+    a maximum number of evaluations, None disables either limit. The clock starts when the
+    budget is created, so one budget can be handed to several solvers run one after the other.
+
+    An evaluation is one candidate solution of the solver's main loop: a sampled move (tabu, SA),
+    a destroy and repair round (LNS), a perturbation and local search (ILS), a child (GA, HGS).
+    Solvers stop at the first of their own stopping criterion and the budget, and return their
+    incumbent. Pass iteration limits of math.inf to run until the budget expires.
+
+    The budget also carries the anytime hook: solvers report every new best solution through
+    improved(), and stop() (e.g. from an on_improvement callback) ends the search early.
+    """
+
+    def __init__(self, time_limit=None, max_evaluations=None):
+        self.time_limit = time_limit
+        self.max_evaluations = max_evaluations
+        self.start = time.perf_counter()
+        self.evaluations = 0
+        self.stopped = False
+
+    def spend(self, evaluations=1):
+        """
+        Records evaluations of candidate solutions
+        """
+        self.evaluations += evaluations
+
+    def stop(self):
+        """
+        Exhausts the budget, the solvers return their incumbent at their next check
+        """
+        self.stopped = True
+
+    def improved(self, on_improvement, cost, routes):
+        """
+        Reports a new best solution to an on_improvement(elapsed, cost, routes) callback (None is a no-op).
+        routes is a function returning a copy of the solution, so nothing is copied unless the
+        callback asks for it (it must call it before returning). A truthy return stops the solver.
+        """
+        if on_improvement is not None and on_improvement(self.elapsed(), cost, routes):
+            self.stop()
+
+    def elapsed(self):
+        """
+        Return:
+            Float: seconds since the budget was created
+        """
+        return time.perf_counter() - self.start
+
+    def exhausted(self):
+        """
+        Return:
+            bool: true once the time limit or the evaluation limit is reached (or after stop)
+        """
+        if self.stopped:
+            return True
+        if self.max_evaluations is not None and self.evaluations >= self.max_evaluations:
+            return True
+        return self.time_limit is not None and time.perf_counter() - self.start >= self.time_limit
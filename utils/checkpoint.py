@@ -0,0 +1,75 @@
+import os
+import pickle
+import random
+import time
+import numpy as np
+
+
+class Checkpoint:
+    """
+    Periodic on-disk checkpoint of a solver run. The solver saves its state (incumbent, current
+    solution, population, tabu list, temperature, ...) together with the states of the random and
+    np.random generators every interval seconds, and its result when it finishes.
+
+    Resume: call the same solver again (same instance and parameters) with a Checkpoint on the same
+    path. It restores the saved state and generators and continues exactly as the interrupted run
+    would have; a finished run returns its result right away. Files are written to a temporary file
+    and renamed, so a run killed while saving leaves the previous checkpoint intact.
+    """
+
+    def __init__(self, path, interval=60.0):
+        self.path = path
+        self.interval = interval
+        self.last_save = time.perf_counter()
+        self.started = time.perf_counter()
+        self.elapsed_before = 0.0
+
+    def elapsed(self):
+        """
+        Return:
+            Float: seconds spent in the solver, including the saved progress of interrupted runs
+        """
+        return self.elapsed_before + time.perf_counter() - self.started
+
+    def due(self):
+        """
+        Return:
+            bool: true if the last save is more than interval seconds ago
+        """
+        return time.perf_counter() - self.last_save >= self.interval
+
+    def save(self, solver, state):
+        """
+        Atomically writes the state of a solver and of the random generators
+        """
+        data = {"solver": solver, "state": state, "elapsed": self.elapsed(),
+                "random": random.getstate(), "numpy": np.random.get_state()}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp-{os.getpid()}"
+        with open(tmp, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.last_save = time.perf_counter()
+
+    def load(self, solver):
+        """
+        Restores the random generators from the checkpoint of a solver (if there is one)
+
+        Return:
+            Dict[str, Any]: saved state of the solver, {"result": routes} for a finished run (None if there is no checkpoint)
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as f:
+            data = pickle.load(f)
+        if data["solver"] != solver:
+            raise ValueError(f"{self.path} is a checkpoint of {data['solver']}, not of {solver}")
+        random.setstate(data["random"])
+        np.random.set_state(data["numpy"])
+        self.elapsed_before = data["elapsed"]
+        self.started = self.last_save = time.perf_counter()
+        return data["state"]
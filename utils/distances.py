@@ -0,0 +1,135 @@
+import math
+from collections import OrderedDict
+import numpy as np
+
+# Storage type of the distances in every mode:
+#   exact:   float64 euclidean distances
+#   float32: float32 euclidean distances (half the memory)
+#   rounded: int32 distances rounded to the nearest integer, the CVRPLIB convention the BKS use
+DISTANCE_MODES = {"exact": np.float64, "float32": np.float32, "rounded": np.int32}
+
+
+def convert_distances(dist, mode):
+    """
+    Converts euclidean distances to the storage type of a distance mode
+
+    Return:
+        np.ndarray: distances in the dtype of DISTANCE_MODES[mode]
+    """
+    if mode not in DISTANCE_MODES:
+        raise ValueError(f"Unknown distance mode {mode}")
+    if mode == "rounded":
+        return np.floor(np.asarray(dist) + 0.5).astype(np.int32)  # nint, as in the CVRPLIB
+    return np.asarray(dist, dtype=DISTANCE_MODES[mode])
+
+
+def improvement_tolerance(edge_weight):
+    """
+    Smallest gain a move needs to count as an improvement. Deltas summed from float32 distances
+    carry rounding noise of a few ulps of the distances, a move and its reverse could both look
+    improving and the local search would cycle, so the tolerance grows with the distance scale.
+
+    Return:
+        Float: tolerance (1e-9 for float64 and integer distances)
+    """
+    if edge_weight.dtype != np.float32:
+        return 1e-9
+    return 64 * float(np.finfo(np.float32).eps) * float(np.max(edge_weight[0]))
+
+
+class DistanceOracle:
+    """
+    Matrix-free replacement for the dense edge_weight matrix of EUC_2D instances.
+    Distances are computed on demand from the node coordinates, the most recently
+    used rows are kept in a bounded cache (cache_size rows, 0 disables it).
+
+    Supports the same indexing the solvers use on the dense matrix:
+        oracle[i, j], oracle[i][j], oracle[i], oracle[array_i, array_j]
+    """
+    __slots__ = ("coords", "cache_size", "mode", "shape", "dtype", "_x", "_y", "_rows")
+
+    def __init__(self, coords, cache_size=1024, mode="exact"):
+        self.coords = np.asarray(coords, dtype=np.float64)
+        self.cache_size = cache_size
+        self.mode = mode
+        self.shape = (len(self.coords), len(self.coords))
+        self.dtype = np.dtype(DISTANCE_MODES[mode])
+        # plain python lists are much faster than numpy for scalar lookups
+        self._x = self.coords[:, 0].tolist()
+        self._y = self.coords[:, 1].tolist()
+        self._rows = OrderedDict()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def row(self, i):
+        """
+        Distances from node i to all nodes (cached)
+
+        Return:
+            np.ndarray: row i of the distance matrix
+        """
+        row = self._rows.get(i)
+        if row is not None:
+            self._rows.move_to_end(i)
+            return row
+        diff = self.coords - self.coords[i]
+        row = convert_distances(np.sqrt((diff * diff).sum(axis=1)), self.mode)
+        if self.cache_size:
+            self._rows[i] = row
+            if len(self._rows) > self.cache_size:
+                self._rows.popitem(last=False)
+        return row
+
+    def pairwise(self, i, j):
+        """
+        Vectorized distances between the nodes in i and j (numpy broadcasting rules)
+
+        Return:
+            np.ndarray: distances with the broadcast shape of i and j
+        """
+        diff = self.coords[np.asarray(i)] - self.coords[np.asarray(j)]
+        return convert_distances(np.sqrt((diff * diff).sum(axis=-1)), self.mode)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            i, j = key
+            if isinstance(i, (int, np.integer)) and isinstance(j, (int, np.integer)):
+                row = self._rows.get(i)
+                if row is not None:
+                    # the same scalar types as the direct computation below (int when rounded)
+                    return row[j] if self.mode == "float32" else row[j].item()
+                dx = self._x[i] - self._x[j]
+                dy = self._y[i] - self._y[j]
+                if self.mode == "exact":
+                    return math.sqrt(dx * dx + dy * dy)
+                if self.mode == "rounded":
+                    return int(math.sqrt(dx * dx + dy * dy) + 0.5)
+                return np.float32(math.sqrt(dx * dx + dy * dy))
+            if isinstance(i, (int, np.integer)) and isinstance(j, slice):
+                return self.row(i)[j]
+            return self.pairwise(i, j)
+        if isinstance(key, (int, np.integer)):
+            return self.row(key)
+        # slices or arrays of rows
+        rows = np.arange(self.shape[0])[key]
+        return self.pairwise(rows[..., None], np.arange(self.shape[1]))
+
+    def __getstate__(self):
+        # the row cache is not worth shipping to other processes
+        return {"coords": self.coords, "cache_size": self.cache_size, "mode": self.mode}
+
+    def __setstate__(self, state):
+        self.__init__(state["coords"], state["cache_size"], state["mode"])
+
+
+def euclidean_oracle(instance, cache_size=1024, mode="exact"):
+    """
+    Creates a distance oracle for an instance with node coordinates
+
+    Return:
+        DistanceOracle: matrix-free edge_weight for the instance
+    """
+    if "node_coord" not in instance or instance.get("edge_weight_type") != "EUC_2D":
+        raise ValueError("A distance oracle needs an EUC_2D instance with node coordinates")
+    return DistanceOracle(instance["node_coord"], cache_size=cache_size, mode=mode)
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from utils.distances import DistanceOracle
+
+# Parsed instances are stored here, one directory per .vrp file content
+INSTANCE_CACHE_DIR = os.path.join("instances", ".cache")
+
+
+def bundle_path(path, *options, cache_dir=INSTANCE_CACHE_DIR):
+    """
+    Cache directory of an instance file: keyed by the hash of the file content and
+    by the loading options that change the stored arrays
+
+    Return:
+        str: path of the bundle directory
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(repr(options).encode())
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}-{digest.hexdigest()[:16]}")
+
+
+def save_bundle(directory, instance):
+    """
+    Writes an instance as a binary bundle: every array to its own .npy file, the remaining
+    fields to meta.json (a DistanceOracle is only flagged with its mode, it is rebuilt from node_coord).
+    The bundle is written next to its final place and renamed, so readers never see a partial one.
+    """
+    tmp = f"{directory}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    meta = {"arrays": [], "oracle": None, "values": {}}
+    for key, value in instance.items():
+        if isinstance(value, DistanceOracle):
+            meta["oracle"] = [key, value.mode]
+        elif isinstance(value, np.ndarray):
+            np.save(os.path.join(tmp, f"{key}.npy"), value)
+            meta["arrays"].append(key)
+        else:
+            meta["values"][key] = value.item() if isinstance(value, np.generic) else value
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    try:
+        os.rename(tmp, directory)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)  # another process wrote the same bundle first
+
+
+def load_bundle(directory, cache_size=1024):
+    """
+    Loads a bundle written by save_bundle, the arrays are read-only memory maps
+    (the pages are shared by all processes loading the same instance). They are returned as
+    plain ndarray views, as every indexing of an np.memmap goes through its Python __getitem__
+
+    Return:
+        Dict[str, Any]: instance subject to analysis (None if there is no bundle)
+    """
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    instance = dict(meta["values"])
+    for key in meta["arrays"]:
+        instance[key] = np.load(os.path.join(directory, f"{key}.npy"), mmap_mode="r").view(np.ndarray)
+    if meta["oracle"] is not None:
+        key, mode = meta["oracle"]
+        instance[key] = DistanceOracle(instance["node_coord"], cache_size=cache_size, mode=mode)
+    return instance
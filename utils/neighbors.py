@@ -0,0 +1,120 @@
+import random
+import numpy as np
+
+# Number of neighbors precomputed by load_instance, requests for a larger
+# granularity recompute the lists once and store them in the instance
+NEIGHBOR_LIST_SIZE = 40
+
+
+def compute_neighbors(edge_weight, k, chunk_size=None):
+    """
+    Computes the k nearest customers of every node (depot included as a row, never as a neighbor).
+    Rows are processed in chunks with np.argpartition, so the dense matrix is never required.
+
+    Return:
+        np.ndarray: (n x k) int array, row i holds the customers closest to node i, sorted by distance
+    """
+    n = edge_weight.shape[0]
+    k = max(0, min(k, n - 2))
+    neighbors = np.empty((n, k), dtype=np.int32)
+    if k == 0:
+        return neighbors
+    all_nodes = np.arange(n)
+    if chunk_size is None:
+        chunk_size = max(1, 2_000_000 // n)  # keeps the temporary block at ~16 MB
+
+    for start in range(0, n, chunk_size):
+        rows = all_nodes[start:start + chunk_size]
+        dist = np.array(edge_weight[rows[:, None], all_nodes[None, :]], dtype=np.float64)
+        dist[:, 0] = np.inf  # the depot is never a candidate
+        dist[np.arange(len(rows)), rows] = np.inf  # neither is the node itself
+        candidates = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(dist, candidates, axis=1), axis=1, kind="stable")
+        neighbors[start:start + len(rows)] = np.take_along_axis(candidates, order, axis=1)
+
+    return neighbors
+
+
+def get_neighbors(instance, granularity):
+    """
+    Returns the granularity-nearest customers of every node, computing the lists
+    on first use and caching them in instance["neighbors"]
+
+    Return:
+        np.ndarray: (n x granularity) int array of neighbor lists
+    """
+    neighbors = instance.get("neighbors")
+    if neighbors is None or neighbors.shape[1] < min(granularity, instance["dimension"] - 2):
+        neighbors = compute_neighbors(instance["edge_weight"], max(granularity, NEIGHBOR_LIST_SIZE))
+        instance["neighbors"] = neighbors
+    return neighbors[:, :granularity]
+
+
+def build_position_index(routes, n):
+    """
+    Maps every customer to its route and position
+
+    Return:
+        List[int]: route index of each node (-1 if not routed)
+        List[int]: position of each node in its route
+    """
+    route_of = [-1] * n
+    position = [-1] * n
+    for r_idx, route in enumerate(routes):
+        for pos, cust in enumerate(route):
+            route_of[cust] = r_idx
+            position[cust] = pos
+    return route_of, position
+
+
+def reindex_places(routes, places, route_of, position):
+    """
+    Re-indexes the customers found at the given (route, position) places, e.g. after a swap
+    """
+    for r_idx, pos in places:
+        cust = routes[r_idx][pos]
+        route_of[cust] = r_idx
+        position[cust] = pos
+
+
+def reindex_routes(routes, r_idxs, route_of, position):
+    """
+    Re-indexes all customers of the given routes, e.g. after a relocate or a tail exchange
+    """
+    for r_idx in r_idxs:
+        for pos, cust in enumerate(routes[r_idx]):
+            route_of[cust] = r_idx
+            position[cust] = pos
+
+
+def sample_granular_exchange(routes, route_of, position, neighbors):
+    """
+    Samples an exchange restricted to the neighbor lists: a random customer u and a
+    random close customer v, u is swapped with the node next to v so that the edge (v, u) is created
+
+    Return:
+        Tuple[int, int, int, int]: route and position of u, route and position of the swap partner
+    """
+    u = random.randint(1, len(route_of) - 1)
+    v = int(neighbors[u][random.randrange(len(neighbors[u]))])
+    r_u, r_v = route_of[u], route_of[v]
+    route_v = routes[r_v]
+    pos_v = position[v]
+    if pos_v + 1 < len(route_v):
+        pos_v += 1
+    elif pos_v > 0:
+        pos_v -= 1
+    return r_u, position[u], r_v, pos_v
+
+
+def sample_granular_place(route_of, position, neighbors):
+    """
+    Samples a place restricted to the neighbor lists: a random customer u and the place right
+    after a random close customer v, so that moving u (or a segment starting at u) there creates the edge (v, u)
+
+    Return:
+        Tuple[int, int, int, int]: route and position of u, route and position right after v
+    """
+    u = random.randint(1, len(route_of) - 1)
+    v = int(neighbors[u][random.randrange(len(neighbors[u]))])
+    return route_of[u], position[u], route_of[v], position[v] + 1
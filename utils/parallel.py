@@ -0,0 +1,185 @@
+import random
+from multiprocessing import Pool, Value, Array, cpu_count
+from multiprocessing import shared_memory
+import numpy as np
+from utils.distances import DistanceOracle
+from utils.utils import compute_total_cost
+from heuristics.construction.random import random_solution
+
+# Instance attached by the initializer of every worker process
+_WORKER = {}
+
+
+class SharedInstance:
+    """
+    Copies the arrays of an instance (coordinates, demands, distance matrix, neighbor lists)
+    into shared memory once, so worker processes attach to them zero-copy instead of
+    re-loading or unpickling the instance. A DistanceOracle is shared through its coordinates.
+
+    Use it as a context manager, the blocks are released on exit:
+        with SharedInstance(instance) as shared:
+            with Pool(initializer=init_worker, initargs=(shared.spec,)) as pool: ...
+    """
+
+    def __init__(self, instance):
+        self.blocks = []
+        # spec: picklable description of the instance, arrays are replaced by (name, shape, dtype)
+        self.spec = {"arrays": {}, "oracle": None, "values": {}}
+        for key, value in instance.items():
+            if isinstance(value, DistanceOracle):
+                self.spec["oracle"] = (key, self._share(value.coords), value.cache_size, value.mode)
+            elif isinstance(value, np.ndarray) and value.nbytes > 0:
+                self.spec["arrays"][key] = self._share(value)
+            else:
+                self.spec["values"][key] = value
+
+    def _share(self, array):
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self.blocks.append(block)
+        return block.name, array.shape, array.dtype.str
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Releases the shared memory blocks (the workers must be done with them)
+        """
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def attach_instance(spec):
+    """
+    Rebuilds an instance from the spec of a SharedInstance, the arrays are read-only views
+    on the shared memory blocks (the blocks stay attached for the lifetime of the process)
+
+    Return:
+        Dict[str, Any]: instance subject to analysis
+    """
+    blocks = _WORKER.setdefault("blocks", [])
+
+    def attach(name, shape, dtype):
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        return array
+
+    instance = dict(spec["values"])
+    for key, (name, shape, dtype) in spec["arrays"].items():
+        instance[key] = attach(name, shape, dtype)
+    if spec["oracle"] is not None:
+        key, (name, shape, dtype), cache_size, mode = spec["oracle"]
+        instance[key] = DistanceOracle(attach(name, shape, dtype), cache_size=cache_size, mode=mode)
+    return instance
+
+
+def init_worker(spec):
+    """
+    Pool initializer: attaches the shared instance once per worker process
+    """
+    _WORKER["instance"] = attach_instance(spec)
+
+
+def worker_instance():
+    """
+    Return:
+        Dict[str, Any]: the instance attached by init_worker in this worker process
+    """
+    return _WORKER["instance"]
+
+
+def shared_register(n):
+    """
+    Creates a best-solution register shared by processes (pass it to them at creation):
+    the best cost and the routes stored depot-separated (route_1, 0, route_2, 0, ...)
+
+    Return:
+        Tuple[Value, Array]: shared register
+    """
+    return Value("d", float('inf')), Array("i", 2 * n, lock=False)
+
+
+def register_cost(register):
+    """
+    Return:
+        Float: cost of the solution in the register (inf if there is none yet), without decoding it
+    """
+    return register[0].value
+
+
+def publish_solution(register, routes, cost):
+    """
+    Writes a solution to the shared best-solution register if it improves it
+    """
+    best_cost, best_routes = register
+    with best_cost.get_lock():
+        if cost >= best_cost.value:
+            return
+        flat = [node for route in routes for node in route + [0]]
+        best_routes[:len(flat)] = flat
+        best_routes[len(flat):] = [0] * (len(best_routes) - len(flat))
+        best_cost.value = cost
+
+
+def read_register(register):
+    """
+    Return:
+        List[List[int]]: best solution published to the register (None if there is none yet)
+        Float: its cost
+    """
+    best_cost, best_routes = register
+    with best_cost.get_lock():
+        flat = best_routes[:]
+        cost = best_cost.value
+    if cost == float('inf'):
+        return None, cost
+    routes, route = [], []
+    for node in flat:
+        if node:
+            route.append(node)
+        elif route:
+            routes.append(route)
+            route = []
+    return routes, cost
+
+
+def _run_start(args):
+    solver, seed, initial, kwargs = args
+    random.seed(seed)
+    np.random.seed(seed)
+    instance = worker_instance()
+    routes = initial(instance) if initial is not None else random_solution(instance)
+    routes = solver(instance, routes, **kwargs)
+    return seed, float(compute_total_cost(routes, instance["edge_weight"])), routes
+
+
+def multi_start(instance, solver, seeds, processes=None, initial=None, **kwargs):
+    """
+    Runs solver(instance, routes, **kwargs) from one start per seed on all cores and keeps the best solution
+    The instance is shared with the workers through shared memory (see SharedInstance)
+    solver: top-level function taking an instance and an initial solution, e.g. iterated_local_search
+    initial: top-level function building the initial solution from the instance (default: random_solution)
+
+    Return:
+        List[List[int]]: best found solution over all starts
+        Float: cost of the best solution
+        Dict[int, float]: cost reached from every seed
+    """
+    seeds = list(seeds)
+    if processes is None:
+        processes = min(cpu_count(), len(seeds))
+    with SharedInstance(instance) as shared:
+        with Pool(processes=processes, initializer=init_worker, initargs=(shared.spec,)) as pool:
+            results = pool.map(_run_start, [(solver, seed, initial, kwargs) for seed in seeds], chunksize=1)
+
+    _, best_cost, best_routes = min(results, key=lambda result: result[1])
+    return best_routes, best_cost, {seed: cost for seed, cost, _ in results}
@@ -0,0 +1,258 @@
+import numpy as np
+
+
+class Solution:
+    """
+    Array-backed VRP solution.
+
+    Next to the routes (lists of customers, depot excluded) it keeps, for every node:
+        route_of[c]  index of the route visiting c (-1 if c is not routed)
+        position[c]  position of c in its route
+        pred[c]      node visited before c (0 = depot)
+        succ[c]      node visited after c (0 = depot)
+    plus the cached load and cost of every route, so neighbors, loads and
+    insertion/removal deltas of a customer are available in O(1).
+
+    Use Solution.from_routes / to_routes to convert from and to the List[List[int]] format.
+    """
+    __slots__ = ("routes", "route_of", "position", "pred", "succ", "loads", "costs",
+                 "demands", "capacity", "edge_weight")
+
+    def __init__(self, instance, routes=()):
+        n = instance["dimension"]
+        self.demands = instance["demand"]
+        self.capacity = instance["capacity"]
+        self.edge_weight = instance["edge_weight"]
+        self.routes = []
+        self.route_of = np.full(n, -1, dtype=np.int32)
+        self.position = np.full(n, -1, dtype=np.int32)
+        self.pred = np.zeros(n, dtype=np.int32)
+        self.succ = np.zeros(n, dtype=np.int32)
+        self.loads = []
+        self.costs = []
+        for route in routes:
+            self.add_route(route)
+
+    @classmethod
+    def from_routes(cls, routes, instance):
+        """
+        Builds a Solution from a List[List[int]] solution (the routes are copied)
+
+        Return:
+            Solution: array-backed solution
+        """
+        return cls(instance, routes)
+
+    def to_routes(self):
+        """
+        Converts back to the List[List[int]] format, empty routes are dropped
+
+        Return:
+            List[List[int]]: VRP solution
+        """
+        return [list(route) for route in self.routes if route]
+
+    def to_state(self):
+        """
+        Compact picklable state for checkpoints: the routes (empty ones included) with their
+        cached loads and costs, so from_state restores the solution exactly
+
+        Return:
+            Dict[str, list]: state of the solution
+        """
+        return {"routes": [route.copy() for route in self.routes], "loads": list(self.loads), "costs": list(self.costs)}
+
+    @classmethod
+    def from_state(cls, state, instance):
+        """
+        Rebuilds a Solution saved with to_state
+
+        Return:
+            Solution: array-backed solution
+        """
+        solution = cls(instance, state["routes"])
+        solution.loads = list(state["loads"])
+        solution.costs = list(state["costs"])
+        return solution
+
+    def copy(self):
+        """
+        Return:
+            Solution: independent copy of the solution
+        """
+        new = Solution.__new__(Solution)
+        new.demands = self.demands
+        new.capacity = self.capacity
+        new.edge_weight = self.edge_weight
+        new.routes = [route.copy() for route in self.routes]
+        new.route_of = self.route_of.copy()
+        new.position = self.position.copy()
+        new.pred = self.pred.copy()
+        new.succ = self.succ.copy()
+        new.loads = self.loads.copy()
+        new.costs = self.costs.copy()
+        return new
+
+    def __len__(self):
+        return len(self.routes)
+
+    def cost(self):
+        """
+        Return:
+            Float: total cost of the solution (from the cached route costs)
+        """
+        return sum(self.costs)
+
+    def customers(self):
+        """
+        Return:
+            np.ndarray: all routed customers
+        """
+        return np.flatnonzero(self.route_of >= 0)
+
+    def add_route(self, route):
+        """
+        Appends a new route
+
+        Return:
+            Int: index of the new route
+        """
+        self.routes.append(list(route))
+        self.loads.append(0)
+        self.costs.append(0)
+        r_idx = len(self.routes) - 1
+        self.refresh_route(r_idx)
+        return r_idx
+
+    def refresh_route(self, r_idx, start=0):
+        """
+        Re-indexes route r_idx from position start on and recomputes its load and cost
+        (use after the route list was modified directly)
+        """
+        route = self.routes[r_idx]
+        edge_weight = self.edge_weight
+        prev = route[start - 1] if start > 0 else 0
+        for pos in range(start, len(route)):
+            cust = route[pos]
+            self.route_of[cust] = r_idx
+            self.position[cust] = pos
+            self.pred[cust] = prev
+            if prev:
+                self.succ[prev] = cust
+            prev = cust
+        if prev:
+            self.succ[prev] = 0
+        self.loads[r_idx] = sum(self.demands[cust] for cust in route)
+        cost = 0
+        prev = 0
+        for cust in route:
+            cost += edge_weight[prev, cust]
+            prev = cust
+        self.costs[r_idx] = cost + edge_weight[prev, 0]
+
+    def neighbors_in_route(self, r_idx, pos):
+        """
+        Return:
+            Tuple[int, int]: nodes before and after position pos of route r_idx (0 = depot)
+        """
+        route = self.routes[r_idx]
+        prev = route[pos - 1] if pos > 0 else 0
+        next = route[pos] if pos < len(route) else 0
+        return prev, next
+
+    def insertion_cost(self, cust, r_idx, pos):
+        """
+        O(1) cost increase of inserting cust into route r_idx before position pos
+
+        Return:
+            Float: delta cost
+        """
+        prev, next = self.neighbors_in_route(r_idx, pos)
+        edge_weight = self.edge_weight
+        return edge_weight[prev, cust] + edge_weight[cust, next] - edge_weight[prev, next]
+
+    def route_insertion_costs(self, customers, r_idx):
+        """
+        Cost increase of inserting each of the customers before every position of route r_idx
+        (position len(route) appends the customer), computed in one vectorized pass
+
+        Return:
+            np.ndarray: (len(customers) x len(route) + 1) delta costs
+        """
+        route = self.routes[r_idx]
+        prev = np.array([0] + route)
+        next = np.array(route + [0])
+        customers = np.asarray(customers)[:, None]
+        edge_weight = self.edge_weight
+        return edge_weight[customers, prev] + edge_weight[customers, next] - edge_weight[prev, next]
+
+    def fits(self, cust, r_idx):
+        """
+        O(1) capacity check for adding cust to route r_idx
+
+        Return:
+            bool: true if the route can take the customer
+        """
+        return self.loads[r_idx] + self.demands[cust] <= self.capacity
+
+    def insert(self, cust, r_idx, pos):
+        """
+        Inserts cust into route r_idx before position pos
+        """
+        prev, next = self.neighbors_in_route(r_idx, pos)
+        edge_weight = self.edge_weight
+        delta = edge_weight[prev, cust] + edge_weight[cust, next] - edge_weight[prev, next]
+        route = self.routes[r_idx]
+        route.insert(pos, cust)
+        self.pred[cust] = prev
+        self.succ[cust] = next
+        if next:
+            self.pred[next] = cust
+        if prev:
+            self.succ[prev] = cust
+        self.route_of[cust] = r_idx
+        for p in range(pos, len(route)):
+            self.position[route[p]] = p
+        self.loads[r_idx] += self.demands[cust]
+        self.costs[r_idx] += delta
+
+    def remove(self, cust):
+        """
+        Removes cust from its route (the route is kept, even if it becomes empty)
+
+        Return:
+            Int: index of the route cust was removed from
+        """
+        r_idx = int(self.route_of[cust])
+        pos = int(self.position[cust])
+        route = self.routes[r_idx]
+        prev = int(self.pred[cust])
+        next = int(self.succ[cust])
+        edge_weight = self.edge_weight
+        self.costs[r_idx] += edge_weight[prev, next] - edge_weight[prev, cust] - edge_weight[cust, next]
+        self.loads[r_idx] -= self.demands[cust]
+        if next:
+            self.pred[next] = prev
+        if prev:
+            self.succ[prev] = next
+        route.pop(pos)
+        for p in range(pos, len(route)):
+            self.position[route[p]] = p
+        self.route_of[cust] = -1
+        self.position[cust] = -1
+        self.pred[cust] = 0
+        self.succ[cust] = 0
+        return r_idx
+
+    def compact(self):
+        """
+        Drops empty routes and re-indexes the remaining ones
+        """
+        if all(self.routes):
+            return
+        keep = [r_idx for r_idx, route in enumerate(self.routes) if route]
+        self.routes = [self.routes[r_idx] for r_idx in keep]
+        self.loads = [self.loads[r_idx] for r_idx in keep]
+        self.costs = [self.costs[r_idx] for r_idx in keep]
+        for r_idx, route in enumerate(self.routes):
+            self.route_of[route] = r_idx
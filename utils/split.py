@@ -0,0 +1,194 @@
+from collections import deque
+from itertools import repeat
+import numpy as np
+
+
+def _giant_tour_arrays(permutation, demand, edge_weight):
+    """
+    Prefix arrays of a giant tour x[0..n-1], a route serving x[i..j-1] costs
+    depot[i] + cum_dist[j] - cum_dist[i+1] + depot[j-1] and loads cum_load[j] - cum_load[i]
+
+    Return:
+        List[float]: depot[i] = d(0, x[i])
+        List[float]: cum_dist[j] = length of the path x[0] -> ... -> x[j-1] (cum_dist[0] = 0)
+        List[int]: cum_load[j] = demand of x[0..j-1]
+    """
+    x = np.asarray(permutation)
+    depot = np.asarray(edge_weight[0, x], dtype=np.float64)
+    legs = np.asarray(edge_weight[x[:-1], x[1:]], dtype=np.float64)
+    cum_dist = np.concatenate(([0.0, 0.0], np.cumsum(legs)))
+    cum_load = np.concatenate(([0], np.cumsum(np.asarray(demand)[x])))
+    return depot.tolist(), cum_dist.tolist(), cum_load.tolist()
+
+
+def _routes_from_pred(permutation, preds):
+    """
+    Cuts the giant tour at the positions stored in preds (one list per route, last route first)
+
+    Return:
+        List[List[int]]: solution of the VRP problem
+    """
+    routes = []
+    j = len(permutation)
+    for pred in preds:
+        if j == 0:
+            break
+        i = pred[j]
+        routes.append(list(permutation[i:j]))
+        j = i
+    routes.reverse()
+    return routes
+
+
+def split_linear(permutation, demand, capacity, edge_weight):
+    """
+    Optimal Split of a giant tour with an unlimited fleet in O(n) (Vidal, 2016)
+
+    p[j] = min over i of p[i] + cost(x[i..j-1]), the candidates i are kept in a deque
+    ordered by f(i) = p[i] + d(0, x[i]) - cum_dist[i+1]: the front is the best predecessor
+    and is dropped once the route to j exceeds the capacity
+
+    Return:
+        List[List[int]]: solution of the VRP problem
+        Float: total cost of the solution
+    """
+    n = len(permutation)
+    if n == 0:
+        return [], 0.0
+    depot, cum_dist, cum_load = _giant_tour_arrays(permutation, demand, edge_weight)
+
+    p = [0.0] + [float('inf')] * n
+    f = [0.0] * n
+    pred = [0] * (n + 1)
+    queue = deque()
+
+    for j in range(1, n + 1):
+        # x[j-1] can start a route
+        i = j - 1
+        f[i] = p[i] + depot[i] - cum_dist[i + 1]
+        while queue and f[queue[-1]] >= f[i]:
+            queue.pop()
+        queue.append(i)
+
+        while cum_load[j] - cum_load[queue[0]] > capacity:
+            queue.popleft()
+            if not queue:
+                raise ValueError(f"Customer {permutation[j - 1]} exceeds the vehicle capacity")
+
+        i = queue[0]
+        p[j] = f[i] + cum_dist[j] + depot[j - 1]
+        pred[j] = i
+
+    return _routes_from_pred(permutation, repeat(pred)), p[n]
+
+
+def split_bounded(permutation, demand, capacity, edge_weight, max_vehicles):
+    """
+    Optimal Split of a giant tour with at most max_vehicles routes in O(n * max_vehicles),
+    one deque pass of split_linear per vehicle
+
+    Return:
+        List[List[int]]: solution of the VRP problem (None if max_vehicles routes are not enough)
+        Float: total cost of the solution (inf if max_vehicles routes are not enough)
+    """
+    n = len(permutation)
+    if n == 0:
+        return [], 0.0
+    depot, cum_dist, cum_load = _giant_tour_arrays(permutation, demand, edge_weight)
+    inf = float('inf')
+
+    p_prev = [0.0] + [inf] * n
+    preds = []
+    best_cost, best_k = inf, None
+
+    for k in range(1, min(max_vehicles, n) + 1):
+        p = [inf] * (n + 1)
+        f = [0.0] * n
+        pred = [-1] * (n + 1)
+        queue = deque()
+
+        for j in range(k, n + 1):
+            # x[j-1] can start the k-th route if the first j-1 customers fit into k-1 routes
+            i = j - 1
+            if p_prev[i] < inf:
+                f[i] = p_prev[i] + depot[i] - cum_dist[i + 1]
+                while queue and f[queue[-1]] >= f[i]:
+                    queue.pop()
+                queue.append(i)
+
+            while queue and cum_load[j] - cum_load[queue[0]] > capacity:
+                queue.popleft()
+
+            if queue:
+                i = queue[0]
+                p[j] = f[i] + cum_dist[j] + depot[j - 1]
+                pred[j] = i
+
+        preds.append(pred)
+        if p[n] < best_cost:
+            best_cost, best_k = p[n], k
+        p_prev = p
+
+    if best_k is None:
+        return None, inf
+    return _routes_from_pred(permutation, preds[best_k - 1::-1]), best_cost
+
+
+def split_batch(cromosoms, demand, capacity, edge_weight, max_vehicles=None):
+    """
+    Optimal Split of a whole batch of giant tours at once. The Bellman recursion runs over
+    the positions, each step is vectorized over all individuals and over the predecessors
+    that can still reach the position within the capacity in at least one individual
+
+    cromosoms: (pop x n) array, one giant tour per row
+
+    Return:
+        np.ndarray: cost of every individual
+        np.ndarray: feasibility flag of every individual (at most max_vehicles routes if set)
+        np.ndarray: (pop x n+1) predecessors, cut the routes of row r with cut_routes(cromosoms[r], pred[r])
+    """
+    x = np.asarray(cromosoms)
+    pop, n = x.shape
+    rows = np.arange(pop)
+
+    depot = np.asarray(edge_weight[0, x], dtype=np.float64)
+    cum_dist = np.zeros((pop, n + 1))
+    if n > 1:
+        cum_dist[:, 2:] = np.cumsum(edge_weight[x[:, :-1], x[:, 1:]], axis=1)
+    cum_load = np.zeros((pop, n + 1))
+    cum_load[:, 1:] = np.cumsum(np.asarray(demand)[x], axis=1)
+    # first feasible predecessor of every position over the whole batch
+    first_start = np.min([np.searchsorted(load, load - capacity) for load in cum_load], axis=0)
+
+    p = np.full((pop, n + 1), np.inf)
+    p[:, 0] = 0
+    f = np.empty((pop, n))
+    pred = np.zeros((pop, n + 1), dtype=np.int64)
+    n_routes = np.zeros((pop, n + 1), dtype=np.int64)
+
+    for j in range(1, n + 1):
+        # x[:, j-1] can start a route
+        f[:, j - 1] = p[:, j - 1] + depot[:, j - 1] - cum_dist[:, j]
+
+        start = min(first_start[j], j - 1)
+        window = np.where(cum_load[:, j, None] - cum_load[:, start:j] <= capacity, f[:, start:j], np.inf)
+        best = np.argmin(window, axis=1)
+        p[:, j] = window[rows, best] + cum_dist[:, j] + depot[:, j - 1]
+        pred[:, j] = start + best
+        n_routes[:, j] = n_routes[rows, start + best] + 1
+
+    costs = p[:, n]
+    feasible = np.isfinite(costs)
+    if max_vehicles is not None:
+        feasible &= n_routes[:, n] <= max_vehicles
+    return costs, feasible, pred
+
+
+def cut_routes(permutation, pred):
+    """
+    Cuts a giant tour into routes at the predecessors computed by split_batch
+
+    Return:
+        List[List[int]]: solution of the VRP problem
+    """
+    return _routes_from_pred(list(permutation), repeat(list(pred)))
@@ -1,5 +1,6 @@
 import random
 import copy
+import numpy as np
 
 def tsp_solver_nn(route, distances):
     """
@@ -11,21 +12,120 @@ def tsp_solver_nn(route, distances):
     """
     if len(route) == 0: # Check for children born with a lower number of vehicles
         return route, 0
+    nodes = np.array([0] + list(route))
+    dist = np.asarray(distances[nodes[:, None], nodes[None, :]], dtype=np.float64)
+    candidates = dist.copy()
+    candidates[:, 0] = np.inf # the depot is never a candidate
     tour = []
-    not_visited = copy.copy(route)
     prev = 0
-    iteration = 1
+    length = 0
+    for _ in range(len(route)):
+        current = int(candidates[prev].argmin())
+        tour.append(current)
+        length += dist[prev, current] # update length
+        candidates[:, current] = np.inf # update not visited
+        prev = current
+    length += dist[prev, 0]
+    return nodes[tour].tolist(), float(length)
+
+def tsp_solver_nn_batch(routes, distances):
+    """
+    Solves the TSPs of all routes of a solution at once using Nearest Neighbor.
+    The routes are padded into one (routes x m+1 x m+1) distance block (index 0 = depot)
+    and all tours are extended in lockstep: every step gathers the row of the current node
+    of every route, masks the visited nodes and takes one argmin over the whole batch
+
+    Return:
+        List[List[int]]: Solution of TSP using NN for every route
+        List[float]: Total length of every solution
+    """
+    if len(routes) == 0:
+        return [], []
+    sizes = np.array([len(route) for route in routes])
+    m = int(sizes.max())
+    nodes = np.zeros((len(routes), m + 1), dtype=np.int64)
+    filled = (np.arange(m + 1)[None, :] >= 1) & (np.arange(m + 1)[None, :] <= sizes[:, None])
+    nodes[filled] = np.concatenate(routes)
+    dist = np.asarray(distances[nodes[:, :, None], nodes[:, None, :]], dtype=np.float64)
+
+    rows = np.arange(len(routes))
+    # visited nodes, the depot and the padding are never candidates
+    blocked = np.where(filled, 0.0, np.inf)
+    current = np.zeros(len(routes), dtype=np.int64)
+    order = np.zeros((len(routes), m + 2), dtype=np.int64)
+
+    for step in range(1, m + 1):
+        current = (dist[rows, current] + blocked).argmin(axis=1) # shorter routes are complete once they return 0
+        order[:, step] = current
+        blocked[rows, current] = np.inf # update not visited
+    order[np.arange(m + 2)[None, :] > sizes[:, None]] = 0
+
+    # depot -> tour -> depot, the padding adds d(0, 0) = 0, cumsum adds the legs in tour order
+    legs = dist[rows[:, None], order[:, :-1], order[:, 1:]]
+    lengths = np.cumsum(legs, axis=1)[:, -1]
+
+    tours = nodes[rows[:, None], order[:, 1:-1]].tolist()
+    return [tour[:size] for tour, size in zip(tours, sizes.tolist())], lengths.tolist()
+
+def tsp_solver_ci(route, distances):
+    """
+    Solves TSP using Cheapest Insertion: starting from the depot, the unvisited node with the
+    cheapest insertion into the partial tour is inserted until all nodes are visited
+    (all node/position pairs of a step are scored at once)
+
+    Return:
+        List[int]: Solution of TSP using CI
+        Float: Total length of the solution
+    """
+    if len(route) == 0:
+        return route, 0
+    nodes = np.array([0] + list(route))
+    dist = np.asarray(distances[nodes[:, None], nodes[None, :]], dtype=np.float64)
+
+    tour = [0] # positions in nodes, the tour returns to the depot after the last one
+    not_visited = np.arange(1, len(nodes))
     length = 0
     while len(not_visited) > 0:
-        sorted_remaining = sorted(not_visited, key=lambda node: distances[prev, node]) 
-        current_node = sorted_remaining[0]
-        tour.append(current_node)
-        length += distances[prev, current_node] # update length
-        not_visited.remove(current_node) # update not visited
-        prev = current_node
-        iteration += 1
-    length += distances[current_node, 0]
-    return tour, length
+        prev = np.array(tour)
+        next = np.roll(prev, -1)
+        cost = dist[not_visited[:, None], prev] + dist[not_visited[:, None], next] - dist[prev, next]
+        node, pos = np.unravel_index(np.argmin(cost), cost.shape)
+        length += cost[node, pos]
+        tour.insert(pos + 1, not_visited[node])
+        not_visited = np.delete(not_visited, node)
+    return nodes[tour[1:]].tolist(), float(length)
+
+def tsp_solver_batch(routes, distances, method="nn"):
+    """
+    Sequences all routes of a solution (education of the GA and HGS children)
+    method: "nn" nearest neighbor, all routes at once (tsp_solver_nn_batch),
+            "ci" cheapest insertion, route by route (tsp_solver_ci): shorter routes at a higher cost
+
+    Return:
+        List[List[int]]: sequenced routes
+        List[float]: Total length of every route
+    """
+    if method == "nn":
+        return tsp_solver_nn_batch(routes, distances)
+    if method == "ci":
+        solved = [tsp_solver_ci(route, distances) for route in routes]
+        return [tour for tour, _ in solved], [length for _, length in solved]
+    raise ValueError(f"Unknown education method {method}")
+
+def tsp_lengths(routes, distances):
+    """
+    Computes the length (depot -> route -> depot) of every route, all legs are gathered at once
+
+    Return:
+        List[float]: Total length of every route
+    """
+    if len(routes) == 0:
+        return []
+    tails = np.concatenate([[0] + list(route) for route in routes])
+    heads = np.concatenate([list(route) + [0] for route in routes])
+    legs = np.asarray(distances[tails, heads], dtype=np.float64)
+    starts = np.cumsum([0] + [len(route) + 1 for route in routes[:-1]])
+    return np.add.reduceat(legs, starts).tolist()
 
 def tsp_solver_ls(route, distances, it = 5):
     """
@@ -77,7 +177,7 @@ def evaluate_TSP_sol(route, edge_weight):
     total_cost = 0
     prev = 0  # start at depot (index 0)
     for cust in route:
-        total_cost += edge_weight[prev][cust]
+        total_cost += edge_weight[prev, cust]
         prev = cust
-    total_cost += edge_weight[prev][0]  # return to depot
+    total_cost += edge_weight[prev, 0]  # return to depot
     return total_cost
\ No newline at end of file
@@ -1,25 +1,139 @@
 import os
 import numpy as np
+import vrplib
+from vrplib.parse.parse_distances import pairwise_euclidean
+from utils.distances import euclidean_oracle, convert_distances
+from utils.neighbors import compute_neighbors, NEIGHBOR_LIST_SIZE
+from utils.instance_cache import bundle_path, load_bundle, save_bundle
+
+# Above this many nodes the dense distance matrix is replaced by a DistanceOracle
+# (Antwerp ~6k nodes: ~290 MB dense, Flanders ~30k nodes: ~7 GB dense)
+DENSE_MATRIX_LIMIT = 3000
+
+def load_instance(instance_name, dense=None, cache_size=1024, n_neighbors=NEIGHBOR_LIST_SIZE, cache=True,
+                  distances="exact"):
+    """
+    Loads an instance from the instances folder.
+    EUC_2D instances above DENSE_MATRIX_LIMIT nodes get a matrix-free distance oracle
+    as edge_weight, set dense=True/False to force either representation.
+    The n_neighbors nearest customers of every node are precomputed in instance["neighbors"]
+    (granular neighborhoods), n_neighbors=0 skips them.
+    cache: the parsed instance (coordinates, demands, distance matrix, neighbor lists) is stored
+    as a binary bundle in INSTANCE_CACHE_DIR and memory-mapped by later loads (see instance_cache.py)
+    distances: "exact" (float64), "float32" or "rounded" (int32 nint distances, the CVRPLIB convention
+    of the BKS in solutions/), see DISTANCE_MODES. The mode is kept in instance["distances"].
+
+    Return:
+        Dict[str, Any]: instance subject to analysis
+    """
+    path = os.path.join("instances", instance_name)
+    if not cache:
+        return _parse_instance(path, dense, cache_size, n_neighbors, distances)
+
+    n_stored = max(n_neighbors, NEIGHBOR_LIST_SIZE) if n_neighbors else 0
+    bundle = bundle_path(path, dense, n_stored, distances)
+    instance = load_bundle(bundle, cache_size)
+    if instance is None:
+        instance = _parse_instance(path, dense, cache_size, n_stored, distances)
+        save_bundle(bundle, instance)
+    if n_neighbors:
+        instance["neighbors"] = instance["neighbors"][:, :n_neighbors]
+    return instance
+
+def _parse_instance(path, dense, cache_size, n_neighbors, distances):
+    """
+    Parses a .vrp file and computes the distances and neighbor lists
+
+    Return:
+        Dict[str, Any]: instance subject to analysis
+    """
+    instance = vrplib.read_instance(path, compute_edge_weights=False)
+    if instance.get("edge_weight_type") != "EUC_2D":
+        # explicit matrices are part of the file, nothing to save here
+        instance = vrplib.read_instance(path)
+        if distances != "exact":
+            instance["edge_weight"] = convert_distances(instance["edge_weight"], distances)
+    else:
+        if dense is None:
+            dense = instance["dimension"] <= DENSE_MATRIX_LIMIT
+        if dense:
+            instance["edge_weight"] = convert_distances(pairwise_euclidean(instance["node_coord"]), distances)
+        else:
+            instance["edge_weight"] = euclidean_oracle(instance, cache_size=cache_size, mode=distances)
+    instance["distances"] = distances
+
+    if n_neighbors:
+        instance["neighbors"] = compute_neighbors(instance["edge_weight"], n_neighbors)
+    return instance
 
 def compute_total_cost(routes, edge_weight):
-    total_cost = 0
+    """
+    Total length of a solution. The legs are gathered in one vectorized lookup and summed in
+    float64 (int64 for the rounded mode), so float32 distances do not lose precision in the sum
+
+    Return:
+        Float: cost of the solution (int with rounded distances)
+    """
+    tour = [0]  # all routes in one closed walk through the depot
     for route in routes:
-        prev = 0  # start at depot (index 0)
-        for cust in route:
-            total_cost += edge_weight[prev][cust]
-            prev = cust
-        total_cost += edge_weight[prev][0]  # return to depot
-    return total_cost
+        tour += route
+        tour.append(0)
+    tour = np.array(tour)
+    legs = np.asarray(edge_weight[tour[:-1], tour[1:]])
+    return legs.sum(dtype=np.int64 if legs.dtype.kind in "iu" else np.float64).item()
+
+def cvrplib_cost(routes, instance):
+    """
+    Cost of a solution with the rounded EUC_2D distances of the CVRPLIB, whatever the distance
+    mode of the instance, so gaps to the BKS in solutions/ are exact
+
+    Return:
+        Float: cost comparable to get_bks
+    """
+    if instance.get("distances") == "rounded" or instance.get("edge_weight_type") != "EUC_2D":
+        return compute_total_cost(routes, instance["edge_weight"])
+    coords = np.asarray(instance["node_coord"], dtype=np.float64)
+    tour = np.array([0] + [node for route in routes for node in route + [0]])
+    diff = coords[tour[:-1]] - coords[tour[1:]]
+    return int(np.floor(np.sqrt((diff * diff).sum(axis=1)) + 0.5).sum())
 
 def compute_route_cost(single_route, edge_weight):
     cost = 0
     prev = 0  # depot
     for cust in single_route:
-        cost += edge_weight[prev][cust]
+        cost += edge_weight[prev, cust]
         prev = cust
-    cost += edge_weight[prev][0]  # return to depot
+    cost += edge_weight[prev, 0]  # return to depot
     return cost
 
+def compute_route_loads(routes, demands):
+    """
+    Computes the load of every route, used as a cache by the neighborhood operators
+
+    Return:
+        List[int]: load of each route
+    """
+    return [sum(demands[cust] for cust in route) for route in routes]
+
+def route_prefix_loads(route, demands):
+    """
+    Prefix loads of a single route: prefix[k] is the demand of route[:k] (prefix[-1] is the route load)
+
+    Return:
+        List[int]: len(route) + 1 prefix loads
+    """
+    return [0] + np.cumsum(np.asarray(demands)[route]).tolist()
+
+def compute_prefix_loads(routes, demands):
+    """
+    Computes the prefix loads of every route, used by the segment operators (relocate, 2-opt*, CROSS)
+    to get the load of any route segment or tail in O(1)
+
+    Return:
+        List[List[int]]: prefix loads of each route
+    """
+    return [route_prefix_loads(route, demands) for route in routes]
+
 def write_solution(file_path, routes, cost):
     with open(file_path, "w") as f:
         for i, route in enumerate(routes, 1):
@@ -39,8 +153,9 @@ def log_results(label, routes, instance, history, runtime=None, bks=None):
     cost = round(compute_total_cost(routes, instance["edge_weight"]), 4)
     assert all(is_feasible(r, instance) for r in routes), \
         f"Infeasible solution detected in {label}"
-    # Calculate the gap in percent between our solutions and the best known solution (bks)
-    gap = ((cost - bks) / bks * 100) if bks else None
+    # Calculate the gap in percent between our solutions and the best known solution (bks),
+    # with the rounded distances the bks are computed with
+    gap = ((cvrplib_cost(routes, instance) - bks) / bks * 100) if bks else None
     history.append((label, cost, gap, runtime, routes))
     # print(f"{label:<25} | Cost: {cost}")
 